@@ -0,0 +1,91 @@
+from collections.abc import Container
+from poslog.FeatureExtractor import FeatureExtractor
+from poslog.ResultCache import ResultCache
+
+class AttributeEncoder:
+    """ Encodes tokens directly into the crfsuite attributes pycrfsuite derives from the feature dicts of FeatureExtractor on every predict:
+    'name:value' for string values, 'name' for 1/True, nothing for 0/False (an attribute of value 0 does not add to any score).
+    The attributes a word contributes (its static ones and the ones it gives its left and right neighbour) are joined once per word,
+    encoded to UTF-8 and cached. Attributes unknown to the model (known_attributes) are dropped, crfsuite would ignore them.
+    Attributes keep the order of the feature dicts, so the scores and tags are identical to tagging the feature dicts. """
+
+    def __init__(self, feature_extractor:FeatureExtractor, known_attributes:Container[str]=None, cache_size:int=20000):
+        self.feature_extractor=feature_extractor
+        self.known_attributes=known_attributes
+        # per word: (static attributes, attributes of its left neighbour, attributes of its right neighbour), 0 disables it
+        self.cache:ResultCache=ResultCache(cache_size) if cache_size else None
+        # cached attributes are stale once the domain words change
+        feature_extractor.kwdet.add_domain_listener(self.clear_cache)
+
+        context=feature_extractor._context_features
+        # attributes of the first and last token instead of the neighbour's ones, in the order of FeatureExtractor._make_features
+        self._first=self._join({'is_first': True}, context)
+        self._not_first=self._join({'is_first': False}, context)
+        self._last=self._join({'is_last': True}, context)
+        self._not_last=self._join({'is_last': False}, context)
+        self._no_next=self._join({'next_word': '', 'next_char': ''}, context)
+        self._no_prev=self._join({'prev_char': '', 'prev_is_determiner': 'False'}, context)
+
+    def clear_cache(self)->None:
+        if self.cache is not None:
+            self.cache.clear()
+
+    def encode(self, words:list[str])->list[list[bytes]]:
+        """ Attributes per token, to be tagged by pycrfsuite.Tagger.tag. """
+        return self._encode(words, self.cache if self.cache is not None else {})
+
+    def encode_batch(self, sents:list[list[str]])->list[list[list[bytes]]]:
+        """ Encodes a batch of token lists. Attributes of a word are joined once per batch (and across calls if the cache is enabled). """
+        words:dict[str,tuple]|ResultCache=self.cache if self.cache is not None else {}
+        return [self._encode(s, words) for s in sents]
+
+    def _encode(self, words:list[str], word_attributes:dict[str,tuple]|ResultCache)->list[list[bytes]]:
+        n=len(words)
+        if n==0:
+            return []
+        entries=[]
+        for word in words:
+            entry=word_attributes.get(word)
+            if entry is None:
+                entry=self.word_attributes(word)
+                word_attributes[word]=entry
+            entries.append(entry)
+
+        last=n-1
+        attributes_list=[]
+        for i, (static, _, _) in enumerate(entries):
+            attributes=static+(self._first if i==0 else self._not_first)+(self._last if i==last else self._not_last)
+            attributes+=entries[i+1][2] if i<last else self._no_next
+            attributes+=entries[i-1][1] if i>0 else self._no_prev
+            attributes_list.append(attributes)
+        return attributes_list
+
+    def word_attributes(self, word:str)->tuple[list[bytes],list[bytes],list[bytes]]:
+        """ Static attributes of word, attributes of the token after word (prev_*) and of the token before word (next_*). """
+        fe=self.feature_extractor
+        context=fe._context_features
+        lower=word.lower()
+        is_upper=str(word.isupper())
+        return (
+            self._join(fe.static_features(word)),
+            self._join({'prev_char': word[-1], 'prev_word': lower, 'prev_is_upper': is_upper, 'prev_is_determiner': str(lower in fe.DETERMINERS)}, context),
+            self._join({'next_word': word, 'next_char': word[0], 'next_is_upper': is_upper}, context),
+        )
+
+    def _join(self, features:dict, selection:Container[str]=None)->list[bytes]:
+        """ Attributes of a feature dict as pycrfsuite names them, of the selected and known ones only. """
+        attributes=[]
+        for key, value in features.items():
+            if selection is not None and key not in selection:
+                continue
+            if isinstance(value, str):
+                attribute=f"{key}:{value}"
+            elif value==1:
+                attribute=key
+            elif value==0:
+                continue
+            else:
+                raise ValueError(f"Feature '{key}' has value {value!r}, attributes encode binary features only.")
+            if self.known_attributes is None or attribute in self.known_attributes:
+                attributes.append(attribute.encode('utf-8'))
+        return attributes
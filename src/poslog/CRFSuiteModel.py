@@ -0,0 +1,276 @@
+from pathlib import Path
+import struct
+
+import logging
+logger = logging.getLogger(__name__)
+
+######################
+# CQDB
+######################
+
+# crfsuite stores labels and attributes in constant quark databases (string <-> id),
+# looked up by Bob Jenkins' lookup3 hash of the null terminated string
+_CQDB_CHUNK = b'CQDB'
+_CQDB_BYTEORDER = 0x62445371
+_CQDB_TABLES = 256
+_CQDB_HEADER = struct.Struct('<4sIIIII')
+_UINT32 = 0xFFFFFFFF
+
+def _rot(x:int, k:int)->int:
+    return ((x << k) | (x >> (32 - k))) & _UINT32
+
+def _hashlittle(key:bytes, initval:int=0)->int:
+    """ lookup3 hashlittle() (byte-wise variant, same values as crfsuite's). """
+    length = len(key)
+    a = b = c = (0xdeadbeef + length + initval) & _UINT32
+    i = 0
+    while length > 12:
+        a = (a + int.from_bytes(key[i:i+4], 'little')) & _UINT32
+        b = (b + int.from_bytes(key[i+4:i+8], 'little')) & _UINT32
+        c = (c + int.from_bytes(key[i+8:i+12], 'little')) & _UINT32
+        # mix(a, b, c)
+        a = (a - c) & _UINT32; a ^= _rot(c, 4); c = (c + b) & _UINT32
+        b = (b - a) & _UINT32; b ^= _rot(a, 6); a = (a + c) & _UINT32
+        c = (c - b) & _UINT32; c ^= _rot(b, 8); b = (b + a) & _UINT32
+        a = (a - c) & _UINT32; a ^= _rot(c, 16); c = (c + b) & _UINT32
+        b = (b - a) & _UINT32; b ^= _rot(a, 19); a = (a + c) & _UINT32
+        c = (c - b) & _UINT32; c ^= _rot(b, 4); b = (b + a) & _UINT32
+        length -= 12
+        i += 12
+    if length == 0:
+        return c
+    tail = key[i:] + bytes(12 - length)
+    a = (a + int.from_bytes(tail[0:4], 'little')) & _UINT32
+    b = (b + int.from_bytes(tail[4:8], 'little')) & _UINT32
+    c = (c + int.from_bytes(tail[8:12], 'little')) & _UINT32
+    # final(a, b, c)
+    c ^= b; c = (c - _rot(b, 14)) & _UINT32
+    a ^= c; a = (a - _rot(c, 11)) & _UINT32
+    b ^= a; b = (b - _rot(a, 25)) & _UINT32
+    c ^= b; c = (c - _rot(b, 16)) & _UINT32
+    a ^= c; a = (a - _rot(c, 4)) & _UINT32
+    b ^= a; b = (b - _rot(a, 14)) & _UINT32
+    c ^= b; c = (c - _rot(b, 24)) & _UINT32
+    return c
+
+def _read_cqdb(data:bytes, offset:int)->list[str]:
+    """ Strings of the database at offset by id. """
+    chunk, _, _, byteorder, num, backward_offset = _CQDB_HEADER.unpack_from(data, offset)
+    if chunk != _CQDB_CHUNK or byteorder != _CQDB_BYTEORDER:
+        raise ValueError(f"No constant quark database at offset {offset}.")
+    strings = []
+    for record in struct.unpack_from(f'<{num}I', data, offset + backward_offset):
+        _, size = struct.unpack_from('<II', data, offset + record)
+        start = offset + record + 8
+        strings.append(data[start:start + size - 1].decode('utf-8'))
+    return strings
+
+def _write_cqdb(strings:list[str])->bytes:
+    """ Database of the strings with their index as id, as written by crfsuite. """
+    records = []
+    tables = [[] for _ in range(_CQDB_TABLES)]
+    backward = []
+    position = _CQDB_HEADER.size + _CQDB_TABLES * 8
+    for id, string in enumerate(strings):
+        key = string.encode('utf-8') + b'\0'
+        hash_value = _hashlittle(key)
+        tables[hash_value % _CQDB_TABLES].append((hash_value, position))
+        backward.append(position)
+        records.append(struct.pack('<II', id, len(key)) + key)
+        position += 8 + len(key)
+    table_refs = []
+    hash_tables = []
+    for table in tables:
+        # open addressing in twice as many buckets as elements
+        size = len(table) * 2
+        buckets = [(0, 0)] * size
+        for hash_value, record in table:
+            k = (hash_value >> 8) % size
+            while buckets[k][1] != 0:
+                k = (k + 1) % size
+            buckets[k] = (hash_value, record)
+        table_refs.append((position if table else 0, size))
+        hash_tables.append(b''.join(struct.pack('<II', *bucket) for bucket in buckets))
+        position += size * 8
+    backward_offset = position
+    position += len(backward) * 4
+    return b''.join([
+        _CQDB_HEADER.pack(_CQDB_CHUNK, position, 0, _CQDB_BYTEORDER, len(backward), backward_offset),
+        b''.join(struct.pack('<II', *ref) for ref in table_refs),
+        *records,
+        *hash_tables,
+        struct.pack(f'<{len(backward)}I', *backward),
+    ])
+
+######################
+# Model
+######################
+
+class CRFSuiteModel:
+    """ Labels, attributes and weights of a crfsuite model file (1st order CRF, as trained by sklearn_crfsuite and loaded by PosLogCRF),
+    read and written without crfsuite, e.g. to change weights of a trained model. Weights are the exact float64 values of the file
+    (CRF.state_features_ parses crfsuite's rounded text dump).
+    state_features: {(attribute id, label id): weight}, transitions: {(label id from, label id to): weight}. """
+
+    MAGIC = b'lCRF'
+    MODEL_TYPE = b'FOMC'
+    VERSION = 100
+    STATE_FEATURE = 0
+    TRANSITION_FEATURE = 1
+
+    _HEADER = struct.Struct('<4sI4s9I')
+    _CHUNK = struct.Struct('<4sII')
+    _FEATURE = struct.Struct('<IIId')
+
+    def __init__(self, labels:list[str], attributes:list[str], state_features:dict[tuple[int,int],float], transitions:dict[tuple[int,int],float]):
+        self.labels = labels
+        self.attributes = attributes
+        self.state_features = state_features
+        self.transitions = transitions
+
+    def __len__(self)->int:
+        """ Number of features. """
+        return len(self.state_features) + len(self.transitions)
+
+    def label_index(self)->dict[str,int]:
+        return {label: i for i, label in enumerate(self.labels)}
+
+    def attribute_index(self)->dict[str,int]:
+        return {attribute: i for i, attribute in enumerate(self.attributes)}
+
+    def state_features_by_name(self)->dict[tuple[str,str],float]:
+        """ Like CRF.state_features_. """
+        return {(self.attributes[a], self.labels[y]): weight for (a, y), weight in self.state_features.items()}
+
+    def transitions_by_name(self)->dict[tuple[str,str],float]:
+        """ Like CRF.transition_features_. """
+        return {(self.labels[i], self.labels[j]): weight for (i, j), weight in self.transitions.items()}
+
+    ######################
+    # Pruning
+    ######################
+
+    def prune(self, min_weight:float=0.0, min_count:int=0, attribute_counts:dict[str,int]=None)->'CRFSuiteModel':
+        """ Model without the state and transition features of |weight|<min_weight and, given attribute_counts (see count_attributes),
+        without the state features of attributes occurring less than min_count times. Attributes without features are dropped on writing. """
+        def keep_attribute(a:int)->bool:
+            return attribute_counts is None or attribute_counts.get(self.attributes[a], 0)>=min_count
+        state_features={(a, y): weight for (a, y), weight in self.state_features.items() if abs(weight)>=min_weight and keep_attribute(a)}
+        transitions={(i, j): weight for (i, j), weight in self.transitions.items() if abs(weight)>=min_weight}
+        return CRFSuiteModel(self.labels, self.attributes, state_features, transitions)
+
+    @staticmethod
+    def count_attributes(X:list[list[dict]])->dict[str,int]:
+        """ Occurrences of the attributes (as crfsuite names them, e.g. 'word:block') in feature dicts X (python-crfsuite format, e.g. of the training corpus). """
+        from collections import Counter
+        from pycrfsuite import ItemSequence
+        counts=Counter()
+        for xseq in X:
+            for item in ItemSequence(xseq).items():
+                counts.update(item.keys())
+        return counts
+
+    ######################
+    # Read & Write
+    ######################
+
+    @classmethod
+    def read(cls, path:str|Path)->'CRFSuiteModel':
+        data = Path(path).read_bytes()
+        return cls.from_bytes(data, path)
+
+    @classmethod
+    def from_bytes(cls, data:bytes, name:str|Path='model')->'CRFSuiteModel':
+        magic, _, model_type, version, _, _, _, off_features, off_labels, off_attrs, _, _ = cls._HEADER.unpack_from(data)
+        if magic != cls.MAGIC or model_type != cls.MODEL_TYPE:
+            raise ValueError(f"{name} is no crfsuite CRF1d model.")
+        if version != cls.VERSION:
+            raise ValueError(f"{name} has version {version}, expected {cls.VERSION}.")
+        _, _, num_features = cls._CHUNK.unpack_from(data, off_features)
+        state_features = {}
+        transitions = {}
+        for feature_type, src, dst, weight in cls._FEATURE.iter_unpack(data[off_features + cls._CHUNK.size:off_features + cls._CHUNK.size + num_features * cls._FEATURE.size]):
+            if feature_type == cls.STATE_FEATURE:
+                state_features[src, dst] = weight
+            else:
+                transitions[src, dst] = weight
+        return cls(_read_cqdb(data, off_labels), _read_cqdb(data, off_attrs), state_features, transitions)
+
+    @classmethod
+    def read_attributes(cls, path:str|Path)->list[str]:
+        """ Attributes of a model file only, without parsing its features. """
+        data = Path(path).read_bytes()
+        magic, _, model_type, _, _, _, _, _, _, off_attrs, _, _ = cls._HEADER.unpack_from(data)
+        if magic != cls.MAGIC or model_type != cls.MODEL_TYPE:
+            raise ValueError(f"{path} is no crfsuite CRF1d model.")
+        return _read_cqdb(data, off_attrs)
+
+    @classmethod
+    def from_crf(cls, crf)->'CRFSuiteModel':
+        """ Model of a trained or loaded sklearn_crfsuite.CRF. """
+        return cls.read(crf.modelfile.name)
+
+    def write(self, path:str|Path)->Path:
+        """ Writes the model like crfsuite: features of weight 0 and attributes without features are dropped (attributes are renumbered). """
+        path = Path(path)
+        path.write_bytes(self.to_bytes())
+        return path
+
+    def to_bytes(self)->bytes:
+        state_features = sorted((a, y, weight) for (a, y), weight in self.state_features.items() if weight != 0)
+        transitions = sorted((i, j, weight) for (i, j), weight in self.transitions.items() if weight != 0)
+        attribute_ids = {}
+        for a, _, _ in state_features:
+            attribute_ids.setdefault(a, len(attribute_ids))
+        attributes = [self.attributes[a] for a in attribute_ids]
+
+        features = [(self.STATE_FEATURE, attribute_ids[a], y, weight) for a, y, weight in state_features]
+        features += [(self.TRANSITION_FEATURE, i, j, weight) for i, j, weight in transitions]
+        feature_chunk = self._CHUNK.pack(b'FEAT', self._CHUNK.size + len(features) * self._FEATURE.size, len(features))
+        feature_chunk += b''.join(self._FEATURE.pack(*feature) for feature in features)
+
+        # feature ids per label (outgoing transitions) and per attribute (state features)
+        label_refs = [[] for _ in self.labels]
+        attribute_refs = [[] for _ in attributes]
+        for fid, (feature_type, src, _, _) in enumerate(features):
+            (label_refs if feature_type == self.TRANSITION_FEATURE else attribute_refs)[src].append(fid)
+
+        off_features = self._HEADER.size
+        off_labels = off_features + len(feature_chunk)
+        labels_chunk = _write_cqdb(self.labels)
+        off_attrs = off_labels + len(labels_chunk)
+        attrs_chunk = _write_cqdb(attributes)
+        off_labelrefs = self._align(off_attrs + len(attrs_chunk))
+        # crfsuite reserves two more label references (without features)
+        labelrefs_chunk = self._refs_chunk(b'LFRF', label_refs + [None, None], off_labelrefs)
+        off_attrrefs = self._align(off_labelrefs + len(labelrefs_chunk))
+        attrrefs_chunk = self._refs_chunk(b'AFRF', attribute_refs, off_attrrefs)
+        size = off_attrrefs + len(attrrefs_chunk)
+
+        # crfsuite leaves num_features of the header 0, the feature chunk holds the number
+        header = self._HEADER.pack(self.MAGIC, size, self.MODEL_TYPE, self.VERSION, 0, len(self.labels), len(attributes),
+                                   off_features, off_labels, off_attrs, off_labelrefs, off_attrrefs)
+        return b''.join([
+            header, feature_chunk, labels_chunk, attrs_chunk,
+            bytes(off_labelrefs - off_attrs - len(attrs_chunk)), labelrefs_chunk,
+            bytes(off_attrrefs - off_labelrefs - len(labelrefs_chunk)), attrrefs_chunk,
+        ])
+
+    @classmethod
+    def _refs_chunk(cls, chunk:bytes, refs:list[list[int]|None], offset:int)->bytes:
+        """ Chunk header, absolute offset of each list (0 for None) and the lists (length and feature ids). """
+        position = offset + cls._CHUNK.size + len(refs) * 4
+        offsets = []
+        lists = []
+        for ref in refs:
+            if ref is None:
+                offsets.append(0)
+                continue
+            offsets.append(position)
+            lists.append(struct.pack(f'<I{len(ref)}I', len(ref), *ref))
+            position += 4 + len(ref) * 4
+        return cls._CHUNK.pack(chunk, position - offset, len(refs)) + struct.pack(f'<{len(refs)}I', *offsets) + b''.join(lists)
+
+    @staticmethod
+    def _align(offset:int)->int:
+        return (offset + 3) // 4 * 4
@@ -0,0 +1,119 @@
+from collections.abc import Callable
+from pathlib import Path
+import hashlib
+import json
+import gc
+import os
+import pickle
+
+import logging
+logger = logging.getLogger(__name__)
+
+######################
+# Worker
+######################
+
+# featurizer of the worker processes, inherited from the parent when forking
+_worker_make_features_batch:Callable[[list[list[str]]],list[list[dict[str,str]]]]=None
+
+def _make_features_chunk(chunk:list[list[str]])->list[list[dict[str,str]]]:
+    return _worker_make_features_batch(chunk)
+
+######################
+# Parallel Featurization
+######################
+
+MIN_CHUNK_SIZE=64
+# chunks per worker, more chunks balance the load better, less chunks share more static features per chunk
+CHUNKS_PER_WORKER=4
+
+def make_features_parallel(make_features_batch:Callable[[list[list[str]]],list[list[dict[str,str]]]], sents:list[list[str]], n_jobs:int=None)->list[list[dict[str,str]]]:
+    """ Featurizes token lists with make_features_batch on a pool of forked worker processes (n_jobs, default: all CPUs), in order.
+    The workers inherit the featurizer (lexicons, caches) from this process. Runs in this process for one job or without the 'fork' start method. """
+    # multiprocessing is imported when needed, not with PosLogCRF
+    import multiprocessing as mp
+    n_jobs=n_jobs if n_jobs is not None and n_jobs>0 else os.cpu_count() or 1
+    n_jobs=min(n_jobs, len(sents)//MIN_CHUNK_SIZE)
+    if n_jobs<=1 or 'fork' not in mp.get_all_start_methods():
+        return make_features_batch(sents)
+    global _worker_make_features_batch
+    _worker_make_features_batch=make_features_batch
+    size=-(-len(sents)//(n_jobs*CHUNKS_PER_WORKER))
+    chunks=[sents[i:i+size] for i in range(0, len(sents), size)]
+    # keep the inherited objects out of the garbage collector to not touch (and copy) their pages
+    gc.freeze()
+    try:
+        with mp.get_context('fork').Pool(n_jobs) as pool:
+            gc.unfreeze()
+            return [features for chunk in pool.map(_make_features_chunk, chunks) for features in chunk]
+    finally:
+        gc.unfreeze()
+        _worker_make_features_batch=None
+
+######################
+# Disk Cache
+######################
+
+class FeatureDiskCache:
+    """ Featurized training corpora on disk, one pickle per corpus, keyed by a hash of the tokens and the version of the feature set
+    (FeatureExtractor.fingerprint). Once the feature set changes, its corpora get new keys; the least recently used entries are deleted beyond max_entries. """
+
+    DEFAULT_DIRECTORY=Path(os.environ.get('POSLOG_CACHE_DIR', Path.home()/'.cache'/'poslog'))/'features'
+    MAX_ENTRIES=16
+    EXTENSION='.features.pkl'
+
+    def __init__(self, directory:str|Path=None, max_entries:int=MAX_ENTRIES):
+        self.directory=Path(directory) if directory is not None else self.DEFAULT_DIRECTORY
+        self.max_entries=max_entries
+        self.hits=0
+        self.misses=0
+
+    @staticmethod
+    def key(sents:list[list[str]], version:str)->str:
+        h=hashlib.sha256(version.encode('utf-8'))
+        h.update(json.dumps(sents).encode('utf-8'))
+        return h.hexdigest()
+
+    def _path(self, key:str)->Path:
+        return self.directory/(key+self.EXTENSION)
+
+    def get(self, key:str)->list[list[dict[str,str]]]|None:
+        path=self._path(key)
+        try:
+            with path.open('rb') as f:
+                features=pickle.load(f)
+        except FileNotFoundError:
+            self.misses+=1
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            logger.warning(f"Dropping unreadable feature cache entry '{path}': {e}")
+            path.unlink(missing_ok=True)
+            self.misses+=1
+            return None
+        # last use for the eviction
+        os.utime(path)
+        self.hits+=1
+        logger.info(f"Loaded features of {len(features)} sentences from '{path}'")
+        return features
+
+    def put(self, key:str, features:list[list[dict[str,str]]])->None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path=self._path(key)
+        # write next to the target and rename, readers never see a partial file
+        tmp_path=path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with tmp_path.open('wb') as f:
+            pickle.dump(features, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_path.replace(path)
+        self._evict()
+
+    def _evict(self)->None:
+        entries=sorted(self.directory.glob('*'+self.EXTENSION), key=lambda path: path.stat().st_mtime, reverse=True)
+        for path in entries[self.max_entries:]:
+            path.unlink(missing_ok=True)
+
+    def clear(self)->None:
+        for path in self.directory.glob('*'+self.EXTENSION):
+            path.unlink(missing_ok=True)
+
+    def stats(self)->dict[str,int]:
+        return {'entries': len(list(self.directory.glob('*'+self.EXTENSION))), 'hits': self.hits, 'misses': self.misses}
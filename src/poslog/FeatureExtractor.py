@@ -0,0 +1,236 @@
+from poslog.words import KnownWordsDetector, RegexTokenClassMatcher, WordKind, TokenClass
+from poslog.ResultCache import ResultCache
+from typing import TYPE_CHECKING
+import hashlib
+import inspect
+import re
+import string
+import sys
+import time
+
+if TYPE_CHECKING:
+    from poslog.PosLogStats import PosLogStats
+
+class FeatureExtractor:
+    """ Feature extraction of PosLog.
+    The declared feature set is compiled once (constant tables, precompiled regexes);
+    static features are computed per word (and cached), neighbour features in one pass over the line. """
+
+    # Features depending on the token only
+    STATIC_FEATURES=(
+        'word',
+        'is_stopword', 'is_wordnet', 'is_domain_word', 'is_number', 'is_unknown',
+        'word_class',
+        'has_upper', 'is-path', 'is_to', 'contains_number', 'contains_punct',
+        'all_caps', 'all_lower',
+        'prefix-1', 'prefix-2', 'suffix-1', 'suffix-2', 'suffix-3',
+        'word.lower', 'suffix3', 'suffix2', 'prefix2', 'prefix3',
+        'is_punct', 'word_shape', 'adj_suffix_match', 'noun_suffix',
+    )
+    # Features depending on the neighbours
+    CONTEXT_FEATURES=(
+        'is_first', 'is_last',
+        'next_word', 'prev_char', 'next_char',
+        'prev_word', 'prev_is_upper', 'next_is_upper',
+        'prev_is_determiner',
+    )
+
+    HAS_UPPER_REGEX=re.compile(r'[A-Z]')
+    PATH_REGEX=re.compile(r'\w*:?([\.\/\\]+[\w\-:]+)+')
+    CONTAINS_NUMBER_REGEX=re.compile(r'[0-9]')
+    CONTAINS_PUNCT_REGEX=re.compile(r'['+string.punctuation+']')
+
+    # particles = {'not', 'off', 'up', 'down'}
+    # interjections = {'oh', 'ah', 'wow', 'hey', 'oops', 'ouch', 'ok', 'bye', 'yes'}
+    ADJECTIVE_SUFFIXES=('ous', 'ful', 'ive', 'able', 'al', 'ic', 'less', 'ish')
+    NOUN_SUFFIXES=('tion', 'ment', 'ness', 'ity', 'ship', 'age', 'ism', 'ence', 'ance', 'hood', 'dom')
+    # e.g., "the big ___" → likely NOUN
+    DETERMINERS=frozenset({'the', 'a', 'an', 'this', 'that', 'these', 'those'})
+    # bump if features change without a change of the source below (e.g. a changed nltk corpus)
+    FEATURE_VERSION=1
+
+    def __init__(self, kwdet:KnownWordsDetector=None, rgtcm:RegexTokenClassMatcher=None, features:list[str]=None, cache_size:int=20000):
+        self.kwdet=kwdet if kwdet is not None else KnownWordsDetector()
+        self.rgtcm=rgtcm if rgtcm is not None else RegexTokenClassMatcher()
+
+        if features is None:
+            features=self.STATIC_FEATURES+self.CONTEXT_FEATURES
+        unknown=set(features)-set(self.STATIC_FEATURES)-set(self.CONTEXT_FEATURES)
+        if unknown:
+            raise ValueError(f"Unknown features: {sorted(unknown)}")
+        self.features:tuple[str,...]=tuple(features)
+        # None if all static features are selected, otherwise the selection
+        self._static_selection:tuple[str,...]=None
+        if set(self.STATIC_FEATURES)-set(features):
+            self._static_selection=tuple(f for f in self.STATIC_FEATURES if f in features)
+        self._context_features:frozenset[str]=frozenset(f for f in self.CONTEXT_FEATURES if f in features)
+        self._all_context_features=self._context_features==frozenset(self.CONTEXT_FEATURES)
+
+        # static (context-free) features per word shared across calls, 0 disables it
+        self.cache:ResultCache=ResultCache(cache_size) if cache_size else None
+        # cached features are stale once the domain words change
+        self.kwdet.add_domain_listener(self.clear_cache)
+        # opt-in timing of the known words and token class lookups (see PosLogCRF.enable_stats)
+        self.stats:'PosLogStats'=None
+
+    def __call__(self, words:list[str])->list[dict[str,str]]:
+        return self.make_features(words)
+
+    def clear_cache(self)->None:
+        if self.cache is not None:
+            self.cache.clear()
+
+    def fingerprint(self)->str|None:
+        """ Version of the feature set: changes with FEATURE_VERSION, the selected features, the source code of the extractor
+        and its detectors (incl. subclasses) and the known words, i.e. whenever make_features may return other features for the same tokens.
+        None if the source code is not available. """
+        h=hashlib.sha256()
+        h.update(f"{self.FEATURE_VERSION}\0{self.features}\0".encode('utf-8'))
+        for obj in (self, self.kwdet, self.rgtcm):
+            source=source_fingerprint(type(obj))
+            if source is None:
+                return None
+            h.update(source.encode('utf-8'))
+        h.update(self.kwdet.fingerprint().encode('utf-8'))
+        return h.hexdigest()
+
+    def make_features(self, words:list[str])->list[dict[str,str]]:
+        return self._make_features(words, self.cache if self.cache is not None else {})
+
+    def make_features_batch(self, sents:list[list[str]])->list[list[dict[str,str]]]:
+        """ Featurizes a batch of token lists. Static token features are shared across the batch (and across calls if the cache is enabled). """
+        static_features:dict[str,dict[str,str]]|ResultCache=self.cache if self.cache is not None else {}
+        return [self._make_features(s, static_features) for s in sents]
+
+    def _make_features(self, words:list[str], static_features:dict[str,dict[str,str]]|ResultCache)->list[dict[str,str]]:
+        n=len(words)
+        if n==0:
+            return []
+        lowers=[word.lower() for word in words]
+        is_uppers=[str(word.isupper()) for word in words]
+        last=n-1
+
+        features_list=[]
+        for i, word in enumerate(words):
+            static=static_features.get(word)
+            if static is None:
+                static=self.static_features(word)
+                static_features[word]=static
+            features=dict(static)
+
+            # ideas from: https://www.geeksforgeeks.org/conditional-random-fields-crfs-for-pos-tagging-in-nlp/
+            features['is_first']=i==0
+            features['is_last']=i==last
+            # Next word to better distinguish between 'to' as ADP and PART
+            if i<last:
+                next_word=words[i+1]
+                features['next_word']=next_word
+                features['next_char']=next_word[0]
+                features['next_is_upper']=is_uppers[i+1]
+            else:
+                features['next_word']=''
+                features['next_char']=''
+            if i>0:
+                features['prev_char']=words[i-1][-1]
+                features['prev_word']=lowers[i-1]
+                features['prev_is_upper']=is_uppers[i-1]
+                features['prev_is_determiner']=str(lowers[i-1] in self.DETERMINERS)
+            else:
+                features['prev_char']=''
+                features['prev_is_determiner']='False'
+
+            if not self._all_context_features:
+                for key in self.CONTEXT_FEATURES:
+                    if key not in self._context_features:
+                        features.pop(key, None)
+            features_list.append(features)
+
+        return features_list
+
+    def static_features(self, word:str)->dict[str,str]:
+        """ Features depending on the token only, not on its neighbours. """
+        if self.stats is None:
+            kind_of_known_word=self.kwdet.kind_of_known_word(word)
+            token_class:TokenClass=self.rgtcm.token_class(word)
+        else:
+            kind_of_known_word, token_class=self._lookup_timed(word)
+        word_lower=word.lower()
+
+        features={
+            'word': word,
+            'is_stopword': 1 if kind_of_known_word == WordKind.STOP_WORD else 0,
+            'is_wordnet': 1 if kind_of_known_word == WordKind.WORD_NET or kind_of_known_word == WordKind.WORDS_DICTIONARY else 0,
+            'is_domain_word': 1 if kind_of_known_word == WordKind.DOMAIN_WORD else 0,
+            'is_number': 1 if kind_of_known_word == WordKind.NUMBER else 0,
+            'is_unknown': 1 if kind_of_known_word == WordKind.UNKNOWN else 0,
+            'word_class': token_class.value,
+            'has_upper': 1 if self.HAS_UPPER_REGEX.search(word) else 0,
+            'is-path': 1 if self.PATH_REGEX.fullmatch(word) else 0,
+            # For better distinguish between 'to' as ADP and PART
+            'is_to': 1 if word_lower == 'to' else 0,
+            'contains_number': 1 if self.CONTAINS_NUMBER_REGEX.search(word) else 0,
+            'contains_punct': 1 if self.CONTAINS_PUNCT_REGEX.search(word) else 0,
+            'all_caps': 1 if word.upper() == word else 0,
+            'all_lower': 1 if word_lower == word else 0,
+            'prefix-1': word[0],
+            'prefix-2': word[:2],
+            'suffix-1': word[-1],
+            'suffix-2': word[-2:],
+            'suffix-3': word[-3:],
+            'word.lower': word_lower,
+            # Prefixes and suffixes — useful for ADJ
+            'suffix3': word_lower[-3:],
+            'suffix2': word_lower[-2:],
+            'prefix2': word_lower[:2],
+            'prefix3': word_lower[:3],
+            # Punctuation — useful to catch INTJ
+            'is_punct': str(word in "!?.;,"),
+            # Shape-based features
+            'word_shape': get_shape(word),
+            'adj_suffix_match': str(word_lower.endswith(self.ADJECTIVE_SUFFIXES)),
+            'noun_suffix': str(word_lower.endswith(self.NOUN_SUFFIXES)),
+        }
+        if self._static_selection is not None:
+            features={key: features[key] for key in self._static_selection}
+        return features
+
+    def _lookup_timed(self, word:str)->tuple[WordKind,TokenClass]:
+        """ Known word kind and token class of word, recorded as stages 'known_words' and 'token_class'. """
+        time_start=time.perf_counter()
+        kind_of_known_word=self.kwdet.kind_of_known_word(word)
+        time_known=time.perf_counter()
+        token_class=self.rgtcm.token_class(word)
+        time_class=time.perf_counter()
+        self.stats.record('known_words', time_known-time_start, 1)
+        self.stats.record('token_class', time_class-time_known, 1)
+        return kind_of_known_word, token_class
+
+def get_shape(word: str) -> str:
+    shape=[]
+    for char in word:
+        if char.isupper():
+            shape.append('X')
+        elif char.islower():
+            shape.append('x')
+        elif char.isdigit():
+            shape.append('d')
+        else:
+            #shape += '_'
+            shape.append(char)
+    return ''.join(shape)
+
+def source_fingerprint(obj)->str|None:
+    """ Hash of the source code of the modules defining a class (and its bases) or a function, None if the source is not available (e.g. a lambda in an interactive session). """
+    classes=[cls for cls in obj.__mro__ if cls is not object] if isinstance(obj, type) else [obj]
+    h=hashlib.sha256()
+    try:
+        for cls in classes:
+            module=sys.modules.get(cls.__module__)
+            try:
+                h.update(inspect.getsource(module).encode('utf-8'))
+            except (OSError, TypeError):
+                # e.g. defined in a notebook cell, where only the object's source is known
+                h.update(inspect.getsource(cls).encode('utf-8'))
+    except (OSError, TypeError):
+        return None
+    return h.hexdigest()
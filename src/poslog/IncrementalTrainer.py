@@ -0,0 +1,174 @@
+from poslog.CRFSuiteModel import CRFSuiteModel
+
+import logging
+logger = logging.getLogger(__name__)
+
+######################
+# Forward-Backward
+######################
+
+def forward_backward(S, mask, T):
+    """ Batched forward-backward of a 1st order CRF (numpy arrays), scaled per position like crfsuite instead of in log space.
+    S: state scores (batch, length, labels), mask: (batch, length) True for tokens (padding at the end), T: transition scores (labels, labels).
+    Returns log partition (batch), marginals (batch, length, labels; 0 for padding) and expected transition counts summed over the batch (labels, labels). """
+    import numpy as np
+    B, N, L = S.shape
+    M = S.max(axis=2, keepdims=True)
+    E = np.exp(S - M)
+    expT = np.exp(T)
+    alpha = np.empty_like(S)
+    beta = np.ones_like(S)
+    scale = np.ones((B, N))
+    scale[:, 0] = E[:, 0].sum(axis=1)
+    alpha[:, 0] = E[:, 0] / scale[:, 0, None]
+    for t in range(1, N):
+        a = (alpha[:, t - 1] @ expT) * E[:, t]
+        c = a.sum(axis=1)
+        # padding carries the last alpha forward
+        alpha[:, t] = np.where(mask[:, t, None], a / c[:, None], alpha[:, t - 1])
+        scale[:, t] = np.where(mask[:, t], c, 1.0)
+    log_z = np.log(scale).sum(axis=1) + (M[:, :, 0] * mask).sum(axis=1)
+    for t in range(N - 2, -1, -1):
+        b = (E[:, t + 1] * beta[:, t + 1]) @ expT.T
+        beta[:, t] = np.where(mask[:, t + 1, None], b / scale[:, t + 1, None], beta[:, t + 1])
+    marginals = alpha * beta * mask[:, :, None]
+    previous = (alpha[:, :-1] * mask[:, 1:, None]).reshape(-1, L)
+    current = (E[:, 1:] * beta[:, 1:] / scale[:, 1:, None]).reshape(-1, L)
+    transitions = expT * (previous.T @ current)
+    return log_z, marginals, transitions
+
+######################
+# Trainer
+######################
+
+class IncrementalTrainer:
+    """ Warm start of a trained crfsuite model on newly labelled sentences. crfsuite always trains from zero weights, so instead the weights
+    are optimized with L-BFGS (scipy) on the new sentences only, with a gaussian prior centered at the current weights:
+        -loglikelihood(new sentences) + c2*||w-w_current||^2
+    Each iteration costs one forward-backward pass over the new sentences, i.e. time is proportional to the new data.
+    Only weights of attributes occurring in the new sentences and transitions change, state features are added for new (attribute, label) pairs
+    (like crfsuite's feature generation) and all transitions are possible (like PosLogCRF.train). """
+
+    # sentences per padded forward-backward batch, sorted by length to keep the padding small
+    BATCH_SIZE = 256
+
+    def __init__(self, model:CRFSuiteModel, c2:float=1.0, max_iterations:int=50, epsilon:float=1e-5):
+        """ c2: strength of the prior, the larger the closer the weights stay to the current ones. """
+        self.model = model
+        self.c2 = c2
+        self.max_iterations = max_iterations
+        self.epsilon = epsilon
+        self.iterations = 0
+
+    def update(self, X:list[list[dict]], y:list[list[str]])->CRFSuiteModel:
+        """ Returns the updated model for feature dicts X (python-crfsuite format, as for CRF.fit) and their labels y. """
+        import numpy as np
+        from scipy.optimize import minimize
+        from scipy.sparse import csr_matrix
+        from pycrfsuite import ItemSequence
+
+        labels = list(self.model.labels)
+        label_ids = {label: i for i, label in enumerate(labels)}
+        for label in (label for tags in y for label in tags):
+            if label not in label_ids:
+                label_ids[label] = len(labels)
+                labels.append(label)
+        attributes = list(self.model.attributes)
+        attribute_ids = {attribute: i for i, attribute in enumerate(attributes)}
+        L = len(labels)
+
+        # tokens x attributes occurring in the new sentences (local ids), values as crfsuite gets them
+        local_ids = {}
+        rows, cols, values = [], [], []
+        gold = []
+        lengths = []
+        for xseq, tags in zip(X, y):
+            if len(xseq) != len(tags):
+                raise ValueError(f"Sentence has {len(xseq)} tokens but {len(tags)} labels.")
+            if not xseq:
+                continue
+            for item, tag in zip(ItemSequence(xseq).items(), tags):
+                for name, value in item.items():
+                    if value == 0:
+                        continue
+                    if name not in attribute_ids:
+                        attribute_ids[name] = len(attributes)
+                        attributes.append(name)
+                    rows.append(len(gold))
+                    cols.append(local_ids.setdefault(attribute_ids[name], len(local_ids)))
+                    values.append(value)
+                gold.append(label_ids[tag])
+            lengths.append(len(xseq))
+        if not lengths:
+            return self.model
+        global_ids = np.array(list(local_ids), dtype=np.int64)
+        A = len(global_ids)
+        features = csr_matrix((values, (rows, cols)), shape=(len(gold), A))
+        gold = np.array(gold)
+        gold_onehot = np.zeros((len(gold), L))
+        gold_onehot[np.arange(len(gold)), gold] = 1.0
+
+        # active state features: existing ones of the occurring attributes and the observed (attribute, label) pairs
+        W0 = np.zeros((A, L))
+        active = np.zeros((A, L), dtype=bool)
+        local_of = {a: i for i, a in enumerate(global_ids.tolist())}
+        for (a, label), weight in self.model.state_features.items():
+            i = local_of.get(a)
+            if i is not None:
+                W0[i, label] = weight
+                active[i, label] = True
+        active |= (features.T @ gold_onehot) != 0
+        T0 = np.zeros((L, L))
+        for (i, j), weight in self.model.transitions.items():
+            T0[i, j] = weight
+        theta0 = np.concatenate([W0[active], T0.ravel()])
+        n_state = int(active.sum())
+
+        # padded batches of similar length, token rows of each sentence into the (batch, length) grid
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        order = np.argsort(lengths, kind='stable')
+        batches = []
+        for b in range(0, len(order), self.BATCH_SIZE):
+            sentences = order[b:b + self.BATCH_SIZE]
+            N = max(lengths[s] for s in sentences)
+            mask = np.zeros((len(sentences), N), dtype=bool)
+            index = np.zeros((len(sentences), N), dtype=np.int64)
+            for k, s in enumerate(sentences):
+                mask[k, :lengths[s]] = True
+                index[k, :lengths[s]] = np.arange(starts[s], starts[s] + lengths[s])
+            batches.append((mask, index))
+        # gold transitions within the sentences
+        first_tokens = np.zeros(len(gold), dtype=bool)
+        first_tokens[starts] = True
+        gold_transitions = np.zeros((L, L))
+        np.add.at(gold_transitions, (gold[:-1][~first_tokens[1:]], gold[1:][~first_tokens[1:]]), 1.0)
+
+        def objective(theta):
+            W = np.zeros((A, L))
+            W[active] = theta[:n_state]
+            T = theta[n_state:].reshape(L, L)
+            scores = np.asarray(features @ W)
+            log_likelihood = (scores[np.arange(len(gold)), gold]).sum() + (gold_transitions * T).sum()
+            expected_states = np.zeros_like(scores)
+            expected_transitions = np.zeros((L, L))
+            for mask, index in batches:
+                log_z, marginals, transitions = forward_backward(scores[index], mask, T)
+                log_likelihood -= log_z.sum()
+                expected_states[index[mask]] = marginals[mask]
+                expected_transitions += transitions
+            gradient_W = np.asarray(features.T @ (expected_states - gold_onehot))
+            difference = theta - theta0
+            value = -log_likelihood + self.c2 * difference @ difference
+            gradient = np.concatenate([gradient_W[active], (expected_transitions - gold_transitions).ravel()]) + 2 * self.c2 * difference
+            return value, gradient
+
+        result = minimize(objective, theta0, jac=True, method='L-BFGS-B', options={'maxiter': self.max_iterations, 'gtol': self.epsilon})
+        self.iterations = result.nit
+        logger.info(f"Incremental training on {len(lengths)} sentences: {result.nit} iterations, loss {result.fun:.2f} ({result.message})")
+
+        state_features = dict(self.model.state_features)
+        for (i, label), weight in zip(np.argwhere(active).tolist(), result.x[:n_state].tolist()):
+            state_features[int(global_ids[i]), label] = weight
+        T = result.x[n_state:].reshape(L, L)
+        transitions = {(i, j): float(T[i, j]) for i in range(L) for j in range(L)}
+        return CRFSuiteModel(labels, attributes, state_features, transitions)
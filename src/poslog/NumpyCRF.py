@@ -0,0 +1,227 @@
+from poslog.AttributeEncoder import AttributeEncoder
+from poslog.CRFSuiteModel import CRFSuiteModel
+from poslog.IncrementalTrainer import forward_backward
+
+import logging
+logger = logging.getLogger(__name__)
+
+class NumpyCRF:
+    """ Weights of a crfsuite model as NumPy arrays and batched decoding without crfsuite: state scores of a whole batch by one (sparse) matrix product,
+    Viterbi and forward-backward vectorized over the padded batch (one loop over the positions instead of one crfsuite call per sequence).
+    Weights are the exact float64 values of the model file (CRF.state_features_ parses crfsuite's rounded text dump), scores are summed in the order of crfsuite,
+    so the tags equal CRF.predict. Items are attribute lists (AttributeEncoder, attributes of weight 1) or feature dicts (python-crfsuite format).
+    Given an AttributeEncoder, token lists are scored without attributes per token: the attribute ids of each distinct word are looked up once and
+    the weights of a token are gathered from the ids of the word and its neighbours (see predict_tokens).
+    W: (attributes, labels) state weights, numpy array or scipy.sparse CSR matrix, T: (labels, labels) transition weights. """
+
+    # sequences per padded batch, sorted by length to keep the padding small (smaller batches keep the (batch, labels, labels) arrays in the cache)
+    BATCH_SIZE=64
+
+    def __init__(self, labels:list[str], attributes:list[str], W, T, encoder:AttributeEncoder=None):
+        self.labels=labels
+        self.attributes=attributes
+        self.W=W
+        self.T=T
+        self.encoder=encoder
+        # dense weights with a row of zeros (id -1) for padding the attribute ids of the tokens
+        self._padded_W=None
+        # attribute ids by name, as str and as UTF-8 bytes (AttributeEncoder)
+        self.attribute_index:dict[str|bytes,int]=_AttributeIndex((attribute, i) for i, attribute in enumerate(attributes))
+        self.attribute_index.update({attribute.encode('utf-8'): i for i, attribute in enumerate(attributes)})
+
+    @classmethod
+    def from_model(cls, model:CRFSuiteModel, sparse:bool=False, encoder:AttributeEncoder=None)->'NumpyCRF':
+        import numpy as np
+        from scipy.sparse import csr_matrix
+        L=len(model.labels)
+        keys=list(model.state_features)
+        rows=np.array([a for a, _ in keys], dtype=np.int64)
+        cols=np.array([y for _, y in keys], dtype=np.int64)
+        values=np.array(list(model.state_features.values()), dtype=np.float64)
+        W=csr_matrix((values, (rows, cols)), shape=(len(model.attributes), L))
+        T=np.zeros((L, L))
+        for (i, j), weight in model.transitions.items():
+            T[i, j]=weight
+        return cls(list(model.labels), list(model.attributes), W if sparse else W.toarray(), T, encoder)
+
+    @classmethod
+    def from_crf(cls, crf, sparse:bool=False, encoder:AttributeEncoder=None)->'NumpyCRF':
+        """ Export of a trained or loaded sklearn_crfsuite.CRF. """
+        return cls.from_model(CRFSuiteModel.from_crf(crf), sparse, encoder)
+
+    ######################
+    # Scores
+    ######################
+
+    def attribute_matrix(self, X:list[list])->'csr_matrix':
+        """ (tokens, attributes) values of the known attributes of all items of X, sequence after sequence. """
+        import numpy as np
+        from itertools import chain
+        from scipy.sparse import csr_matrix
+        from pycrfsuite import ItemSequence
+        if any(xseq and isinstance(xseq[0], dict) for xseq in X):
+            # feature dicts: names and values as python-crfsuite converts them
+            items=[list(item.items()) for xseq in X for item in (ItemSequence(xseq).items() if xseq and isinstance(xseq[0], dict) else [{a: 1.0 for a in i} for i in xseq])]
+            names=[[name for name, _ in item] for item in items]
+            values=np.fromiter((value for item in items for _, value in item), dtype=np.float64)
+        else:
+            names=list(chain.from_iterable(X))
+            values=None
+        counts=np.fromiter(map(len, names), dtype=np.int64, count=len(names))
+        # lookups in C, unknown attributes get -1
+        ids=np.fromiter(map(self.attribute_index.__getitem__, chain.from_iterable(names)), dtype=np.int64, count=int(counts.sum()))
+        known=ids>=0
+        rows=np.repeat(np.arange(len(names)), counts)[known]
+        indptr=np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=len(names)))])
+        values=values[known] if values is not None else np.ones(len(rows))
+        return csr_matrix((values, ids[known], indptr), shape=(len(names), len(self.attributes)))
+
+    def state_scores(self, X:list[list])->list:
+        """ (length, labels) state scores per sequence. """
+        import numpy as np
+        if not X:
+            return []
+        scores=self.attribute_matrix(X)@self.W
+        scores=scores.toarray() if hasattr(scores, 'toarray') else np.asarray(scores)
+        return np.split(scores, np.cumsum([len(xseq) for xseq in X])[:-1])
+
+    def token_state_scores(self, sents:list[list[str]])->list:
+        """ (length, labels) state scores per token list, from the attributes of the encoder. """
+        import numpy as np
+        from itertools import chain
+        if self.encoder is None:
+            raise ValueError("Scoring tokens needs an AttributeEncoder, none is exported for features of a custom or overridden make_features: pass their feature dicts to state_scores (or predict/predict_marginals) instead.")
+        if self._padded_W is None:
+            W=self.W.toarray() if hasattr(self.W, 'toarray') else np.asarray(self.W)
+            self._padded_W=np.vstack([W, np.zeros((1, len(self.labels)))])
+        encoder=self.encoder
+        lengths=np.fromiter(map(len, sents), dtype=np.int64, count=len(sents))
+        n=int(lengths.sum())
+        if n==0:
+            return [np.zeros((0, len(self.labels))) for _ in sents]
+        word_ids={}
+        tokens=np.fromiter((word_ids.setdefault(word, len(word_ids)) for word in chain.from_iterable(sents)), dtype=np.int64, count=n)
+
+        # attributes of the distinct words (static, given to the right and to the left neighbour), then of the boundaries
+        entries=[]
+        for word in word_ids:
+            entry=encoder.cache.get(word) if encoder.cache is not None else None
+            if entry is None:
+                entry=encoder.word_attributes(word)
+                if encoder.cache is not None:
+                    encoder.cache[word]=entry
+            entries.append(entry)
+        static=self._attribute_ids([entry[0] for entry in entries])
+        prev=self._attribute_ids([entry[1] for entry in entries]+[encoder._no_prev])
+        next_=self._attribute_ids([entry[2] for entry in entries]+[encoder._no_next])
+        is_first=self._attribute_ids([encoder._not_first, encoder._first])
+        is_last=self._attribute_ids([encoder._not_last, encoder._last])
+        first=np.zeros(n, dtype=bool)
+        first[np.cumsum(lengths[lengths>0])[:-1]]=True
+        first[0]=True
+        last=np.roll(first, -1)
+
+        # one attribute after the other like crfsuite (unknown attributes and padding add 0): static ones first, i.e. summed once per word,
+        # then is_first, is_last, next_*, prev_*
+        W=self._padded_W
+        static_scores=np.zeros((len(entries), len(self.labels)))
+        for k in range(static.shape[1]):
+            static_scores+=W[static[:, k]]
+        scores=static_scores[tokens]
+        for block in (is_first[first.astype(np.int64)], is_last[last.astype(np.int64)],
+                      next_[np.where(last, len(entries), np.roll(tokens, -1))], prev[np.where(first, len(entries), np.roll(tokens, 1))]):
+            for k in range(block.shape[1]):
+                scores+=W[block[:, k]]
+        return np.split(scores, np.cumsum(lengths)[:-1])
+
+    def _attribute_ids(self, rows:list[list[bytes]]):
+        """ Ids of the attributes per row as a matrix, padded with -1 (like unknown attributes). """
+        import numpy as np
+        from itertools import chain
+        counts=np.fromiter(map(len, rows), dtype=np.int64, count=len(rows))
+        ids=np.fromiter(map(self.attribute_index.__getitem__, chain.from_iterable(rows)), dtype=np.int64, count=int(counts.sum()))
+        matrix=np.full((len(rows), int(counts.max(initial=0))), -1, dtype=np.int64)
+        row_of=np.repeat(np.arange(len(rows)), counts)
+        matrix[row_of, np.arange(len(ids))-np.repeat(np.cumsum(counts)-counts, counts)]=ids
+        return matrix
+
+    def _batches(self, scores:list):
+        """ Yields (sequence indices, padded state scores (batch, length, labels), mask (batch, length)) of batches of similar length. """
+        import numpy as np
+        order=sorted((i for i in range(len(scores)) if len(scores[i])>0), key=lambda i: len(scores[i]))
+        for b in range(0, len(order), self.BATCH_SIZE):
+            sequences=order[b:b+self.BATCH_SIZE]
+            N=len(scores[sequences[-1]])
+            S=np.zeros((len(sequences), N, len(self.labels)))
+            mask=np.zeros((len(sequences), N), dtype=bool)
+            for k, s in enumerate(sequences):
+                S[k, :len(scores[s])]=scores[s]
+                mask[k, :len(scores[s])]=True
+            yield sequences, S, mask
+
+    ######################
+    # Decoding
+    ######################
+
+    def viterbi(self, S, mask):
+        """ Best label ids (batch, length) for padded state scores S (batch, length, labels) and mask (batch, length), -1 for padding.
+        Ties go to the lowest label id, like crfsuite. """
+        import numpy as np
+        B, N, L=S.shape
+        delta=S[:, 0].copy()
+        backpointers=np.zeros((B, N, L), dtype=np.int64)
+        for t in range(1, N):
+            # max-plus product: scores[b, i, j] of label i at t-1 followed by label j at t
+            scores=delta[:, :, None]+self.T
+            best=scores.argmax(axis=1)
+            current=scores.max(axis=1)+S[:, t]
+            # padding keeps the scores and points to the same label
+            delta=np.where(mask[:, t, None], current, delta)
+            backpointers[:, t]=np.where(mask[:, t, None], best, np.arange(L))
+        path=np.empty((B, N), dtype=np.int64)
+        path[:, N-1]=delta.argmax(axis=1)
+        for t in range(N-1, 0, -1):
+            path[:, t-1]=np.take_along_axis(backpointers[:, t], path[:, t, None], axis=1)[:, 0]
+        return np.where(mask, path, -1)
+
+    def decode(self, scores:list)->list[list[str]]:
+        """ Tags per sequence of (length, labels) state scores. """
+        import numpy as np
+        labels=np.array(self.labels, dtype=object)
+        tags:list[list[str]]=[[] for _ in scores]
+        for sequences, S, mask in self._batches(scores):
+            path=self.viterbi(S, mask)
+            for k, s in enumerate(sequences):
+                tags[s]=labels[path[k, :len(scores[s])]].tolist()
+        return tags
+
+    def marginals(self, scores:list)->list:
+        """ (length, labels) probabilities of the labels per token, per sequence of (length, labels) state scores. """
+        import numpy as np
+        marginals=[np.zeros((0, len(self.labels))) for _ in scores]
+        for sequences, S, mask in self._batches(scores):
+            _, batch_marginals, _=forward_backward(S, mask, self.T)
+            for k, s in enumerate(sequences):
+                marginals[s]=batch_marginals[k, :len(scores[s])]
+        return marginals
+
+    def predict(self, X:list[list])->list[list[str]]:
+        """ Tags per sequence of attribute lists or feature dicts, like CRF.predict. """
+        return self.decode(self.state_scores(X))
+
+    def predict_marginals(self, X:list[list])->list:
+        """ Like CRF.predict_marginals, but (length, labels) arrays with the columns in the order of labels. """
+        return self.marginals(self.state_scores(X))
+
+    def predict_tokens(self, sents:list[list[str]])->list[list[str]]:
+        """ Tags per token list (needs the encoder), like PosLogCRF.predict_batch. """
+        return self.decode(self.token_state_scores(sents))
+
+    def predict_marginals_tokens(self, sents:list[list[str]])->list:
+        """ predict_marginals of token lists (needs the encoder). """
+        return self.marginals(self.token_state_scores(sents))
+
+class _AttributeIndex(dict):
+    """ -1 for unknown attributes instead of a KeyError. """
+    def __missing__(self, key)->int:
+        return -1
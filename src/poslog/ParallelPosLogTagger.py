@@ -0,0 +1,119 @@
+from collections import deque
+from collections.abc import Iterable, Iterator
+from itertools import islice
+import multiprocessing as mp
+import gc
+import os
+
+from poslog.PosLogCRF import PosLogCRF
+
+import logging
+logger = logging.getLogger(__name__)
+
+######################
+# Worker
+######################
+
+# PosLogCRF of the worker process, inherited from the parent when forking
+_worker_pos_log:PosLogCRF=None
+
+def _init_worker(pos_log_kwargs:dict)->None:
+    global _worker_pos_log
+    if _worker_pos_log is None:
+        # spawned worker (or nothing to inherit): initialize once per process
+        _worker_pos_log=PosLogCRF(**pos_log_kwargs)
+        _worker_pos_log.load_model()
+
+def _predict_tokens_chunk(chunk:list[list[str]])->list[list[str]]:
+    return _worker_pos_log.predict_batch(chunk)
+
+def _predict_strings_chunk(chunk:list[str])->list[list[tuple[str,str]]]:
+    return _worker_pos_log.predict_strings_as_tuple(chunk)
+
+######################
+# Parallel Tagger
+######################
+
+class ParallelPosLogTagger:
+    """ Tags lines with PosLogCRF on a pool of worker processes.
+    With the 'fork' start method the model and lexicons are loaded once in the parent and shared with the workers,
+    otherwise every worker loads them once. The order of the results is preserved. """
+
+    MIN_CHUNK_SIZE=16
+    MAX_CHUNK_SIZE=2048
+    # chunks per worker and batch, more chunks balance the load better, less chunks cost less IPC
+    CHUNKS_PER_WORKER=4
+
+    def __init__(self, n_jobs:int=None, start_method:str=None, **pos_log_kwargs):
+        """ n_jobs: number of worker processes (default: all CPUs), pos_log_kwargs: arguments of PosLogCRF. """
+        self.n_jobs=n_jobs if n_jobs is not None and n_jobs>0 else os.cpu_count() or 1
+        self.pos_log_kwargs=pos_log_kwargs
+        if start_method is None:
+            start_method='fork' if 'fork' in mp.get_all_start_methods() else mp.get_start_method()
+        self.start_method=start_method
+        self._pool=None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start(self)->None:
+        if self._pool is not None:
+            return
+        global _worker_pos_log
+        ctx=mp.get_context(self.start_method)
+        if self.start_method=='fork':
+            # load everything once, the workers inherit it copy-on-write
+            _worker_pos_log=PosLogCRF(**self.pos_log_kwargs)
+            _worker_pos_log.load_model()
+            # keep the inherited objects out of the garbage collector to not touch (and copy) their pages
+            gc.freeze()
+        logger.info(f"Starting {self.n_jobs} workers ({self.start_method})")
+        self._pool=ctx.Pool(self.n_jobs, initializer=_init_worker, initargs=(self.pos_log_kwargs,))
+        if self.start_method=='fork':
+            gc.unfreeze()
+            _worker_pos_log=None
+
+    def close(self)->None:
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool=None
+
+    def chunk_size(self, n:int)->int:
+        """ Chunk size adapted to the number of lines and workers. """
+        size=-(-n//(self.n_jobs*self.CHUNKS_PER_WORKER))
+        return max(self.MIN_CHUNK_SIZE, min(self.MAX_CHUNK_SIZE, size))
+
+    def _map(self, func, X:list)->list:
+        self.start()
+        size=self.chunk_size(len(X))
+        chunks=[X[i:i+size] for i in range(0, len(X), size)]
+        return [y for chunk in self._pool.map(func, chunks) for y in chunk]
+
+    def predict_batch(self, X:list[list[str]])->list[list[str]]:
+        return self._map(_predict_tokens_chunk, X)
+
+    def predict_strings(self, X:list[str])->list[list[str]]:
+        return [[tag for _, tag in line] for line in self.predict_strings_as_tuple(X)]
+
+    def predict_strings_as_tuple(self, X:list[str])->list[list[tuple[str,str]]]:
+        return self._map(_predict_strings_chunk, X)
+
+    def imap_strings_as_tuple(self, lines:Iterable[str], chunk_size:int=None)->Iterator[list[tuple[str,str]]]:
+        """ Tags an (unbounded) iterable of lines lazily in chunks, yields one result per line in order.
+        At most two chunks per worker are in flight, so memory stays bounded. """
+        self.start()
+        size=chunk_size or self.MAX_CHUNK_SIZE//4
+        it=iter(lines)
+        chunks=iter(lambda: list(islice(it, size)), [])
+        pending=deque()
+        for chunk in chunks:
+            pending.append(self._pool.apply_async(_predict_strings_chunk, (chunk,)))
+            if len(pending)>=2*self.n_jobs:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
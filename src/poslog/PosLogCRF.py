@@ -1,53 +1,136 @@
-from sklearn_crfsuite import CRF
+from typing import TYPE_CHECKING
+import hashlib
 import pickle
 import os
-from poslog.words import KnownWordsDetector, RegexTokenClassMatcher, WordKind, TokenClass
+import shutil
+import time
+from poslog.words import KnownWordsDetector, RegexTokenClassMatcher
 from poslog.AbstractPosTagger import AbstractPosTagger
 from poslog.PosLogTokenizer import PosLogTokenizer
+from poslog.ResultCache import ResultCache
+from poslog.FeatureExtractor import FeatureExtractor, get_shape, source_fingerprint
+from poslog.FeatureDiskCache import FeatureDiskCache, make_features_parallel
+from poslog.AttributeEncoder import AttributeEncoder
+from poslog.PosLogStats import PosLogStats
 import logging
-import re
-import string
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+if TYPE_CHECKING:
+    from sklearn_crfsuite import CRF
+    from poslog.NumpyCRF import NumpyCRF
+
 class PosLogCRF(AbstractPosTagger):
     DEFAULT_MODEL_PATH='models'
     DEFAULT_MODEL='pos_log_upos_crf_10k_model'
-
-    def __init__(self, model_path:str=None, make_features=None):    
+    # native crfsuite model file (read by crfsuite directly) and pickled sklearn_crfsuite.CRF
+    NATIVE_MODEL_EXTENSION='.crfsuite'
+    PICKLE_MODEL_EXTENSION='.pkl'
+    # hyperparameters of train
+    CRF_PARAMS={
+        'algorithm': 'lbfgs',
+        'c1': 0.1,
+        'c2': 0.1,
+        'max_iterations': 30, #More iterations takes too long#100,
+        'all_possible_transitions': True,
+    }
+
+    def __init__(self, model_path:str=None, make_features=None, cache_size:int=None, cache_max_bytes:int=None, feature_cache_size:int=20000, domain_words_files:list[str]=None, feature_disk_cache:bool|str=False, stats:bool|PosLogStats=False):    
         self.model_path = self._get_model_path(model_path)
         self.crf = None
-        self.kwdet=KnownWordsDetector()
-        self.rgtcm=RegexTokenClassMatcher()
         self.tokenizer:PosLogTokenizer=None
 
-        #TODO
-        if make_features is not None:
-            self.make_features=make_features
-
-    def train(self, X_train_tokens:list[list[str]], y_train_tags:list[list[str]])->None:
-        self.crf = CRF(algorithm='lbfgs', 
-                       c1=0.1, 
-                       c2=0.1, 
-                       max_iterations=30, #More iterations takes too long#100, 
-                       all_possible_transitions=True)
-        feat=[self.make_features(s) for s in X_train_tokens]
+        # opt-in result cache keyed on the raw line (predict_string*) or the token tuple (predict*), a limit of 0 disables it
+        self.result_cache:ResultCache=None
+        if (cache_size is not None or cache_max_bytes is not None) and 0 not in (cache_size, cache_max_bytes):
+            self.result_cache=ResultCache(cache_size, cache_max_bytes)
+
+        # make_features is either a FeatureExtractor or any callable(list[str])->list[dict[str,str]]
+        self._custom_make_features=False
+        if isinstance(make_features, FeatureExtractor):
+            self.feature_extractor=make_features
+        else:
+            self.feature_extractor=FeatureExtractor(KnownWordsDetector(), RegexTokenClassMatcher(), cache_size=feature_cache_size)
+            if make_features is not None:
+                self._custom_make_features=True
+                self.make_features=make_features
+        self.kwdet=self.feature_extractor.kwdet
+        # predict encodes tokens into crfsuite attributes instead of feature dicts (see AttributeEncoder), built per model
+        self.feature_cache_size=feature_cache_size
+        self.attribute_encoder:AttributeEncoder=None
+        self._attribute_encoder_crf:'CRF'=None
+        # export of the current model for predict_batch_confidence
+        self._numpy_crf:'NumpyCRF'=None
+        self._numpy_crf_crf:'CRF'=None
+        self.rgtcm=self.feature_extractor.rgtcm
+        # results are stale once the domain words change (the feature extractor drops its own cache)
+        self.kwdet.add_domain_listener(self.clear_cache)
+        if domain_words_files:
+            for file in domain_words_files:
+                self.kwdet.load_domain_words(file)
+
+        # opt-in disk cache of featurized training corpora (True: default directory, or a directory)
+        self.feature_disk_cache:FeatureDiskCache=None
+        if feature_disk_cache:
+            self.feature_disk_cache=FeatureDiskCache(None if feature_disk_cache is True else feature_disk_cache)
+
+        # opt-in latency statistics per stage (True: new PosLogStats, or one to share)
+        self.stats:PosLogStats=None
+        if stats:
+            self.enable_stats(None if stats is True else stats)
+
+    def train(self, X_train_tokens:list[list[str]], y_train_tags:list[list[str]], n_jobs:int=1, crf_params:dict=None)->None:
+        """ n_jobs: processes for the feature extraction (None: all CPUs), crf_params: arguments of sklearn_crfsuite.CRF (default: CRF_PARAMS, e.g. found by poslog.tuning). """
+        from sklearn_crfsuite import CRF
+        self.crf = CRF(**(crf_params if crf_params is not None else self.CRF_PARAMS))
+        feat=self.make_features_corpus(X_train_tokens, n_jobs)
         self.crf.fit(feat, y_train_tags)
+        self.clear_cache()
+        self.save_model(self.model_path)
+
+    def train_from_tagged_sents(self, tagged_sents:list[list[tuple[str,str]]], n_jobs:int=1, crf_params:dict=None)->None:
+        X_train_tokens=[[word for word,_ in tagged_sent] for tagged_sent in tagged_sents]
+        y_train_tags=[[tag for _,tag in tagged_sent] for tagged_sent in tagged_sents]
+        self.train(X_train_tokens, y_train_tags, n_jobs, crf_params)
+
+    def train_incremental(self, X_train_tokens:list[list[str]], y_train_tags:list[list[str]], c2:float=1.0, max_iterations:int=50)->None:
+        """ Updates the current model (loaded if needed) with newly labelled sentences instead of retraining on all data.
+        Takes time proportional to the new sentences, c2 keeps the weights close to the current ones (see IncrementalTrainer). """
+        from sklearn_crfsuite import CRF
+        from poslog.CRFSuiteModel import CRFSuiteModel
+        from poslog.IncrementalTrainer import IncrementalTrainer
+        if self.crf is None:
+            self.load_model()
+        feat=self.make_features_corpus(X_train_tokens)
+        model=IncrementalTrainer(CRFSuiteModel.from_crf(self.crf), c2=c2, max_iterations=max_iterations).update(feat, y_train_tags)
+        # same hyperparameters, but a new (temporary) model file instead of the loaded one
+        crf=CRF(**{**self.crf.get_params(), 'model_filename': None})
+        crf.modelfile.refresh()
+        model.write(crf.modelfile.name)
+        crf.tagger_
+        self.crf=crf
+        self.clear_cache()
         self.save_model(self.model_path)
 
-    def train_from_tagged_sents(self, tagged_sents:list[list[tuple[str,str]]])->None:
+    def train_incremental_from_tagged_sents(self, tagged_sents:list[list[tuple[str,str]]], **kwargs)->None:
         X_train_tokens=[[word for word,_ in tagged_sent] for tagged_sent in tagged_sents]
         y_train_tags=[[tag for _,tag in tagged_sent] for tagged_sent in tagged_sents]
-        self.train(X_train_tokens, y_train_tags)
+        self.train_incremental(X_train_tokens, y_train_tags, **kwargs)
 
-    def _get_model_path(self, model:str=None):
-        """ Returns absolute path to model file. If model_path is not given, the default model is used. """
+    @classmethod
+    def _get_model_path(cls, model:str=None):
+        """ Returns absolute path to model file. If model_path is not given, the default model is used.
+        Relative model names without extension prefer an existing native model over the pickled one. """
         def rel_model_path(model:str):
-            model_path=os.path.join(os.path.dirname(__file__), self.DEFAULT_MODEL_PATH)
+            model_path=os.path.join(os.path.dirname(__file__), cls.DEFAULT_MODEL_PATH)
             # make sure directory exists
             os.makedirs(model_path, exist_ok=True)
-            return os.path.join(model_path, model+'.pkl')
+            model_file=os.path.join(model_path, model)
+            if model.endswith((cls.NATIVE_MODEL_EXTENSION, cls.PICKLE_MODEL_EXTENSION)):
+                return model_file
+            if os.path.exists(model_file+cls.NATIVE_MODEL_EXTENSION):
+                return model_file+cls.NATIVE_MODEL_EXTENSION
+            return model_file+cls.PICKLE_MODEL_EXTENSION
         if model is not None:
             if os.path.isabs(model):
                 return model
@@ -55,21 +138,114 @@ class PosLogCRF(AbstractPosTagger):
                 return rel_model_path(model)
         else:
             # choose default model
-            return rel_model_path(self.DEFAULT_MODEL)
+            return rel_model_path(cls.DEFAULT_MODEL)
+
+    def _is_default_model_path(self, model_path:str)->bool:
+        default_model=os.path.splitext(self._get_model_path(self.DEFAULT_MODEL))[0]
+        return os.path.splitext(model_path)[0]==default_model
 
     def save_model(self, model:str=None):
+        """ Saves the model as native crfsuite file if the path ends with '.crfsuite', otherwise pickled. """
         model_path=self._get_model_path(model)
-        if model_path==self._get_model_path(self.DEFAULT_MODEL):
+        if self._is_default_model_path(model_path):
             logger.warning("Default model path is used. Won't save it. If you want to save the model to a different location, provide a model path.")
             return
-        with open(model_path, 'wb') as f:
-            pickle.dump(self.crf, f)
+        if model_path.endswith(self.NATIVE_MODEL_EXTENSION):
+            shutil.copyfile(self.crf.modelfile.name, model_path)
+        else:
+            crf=self.crf
+            if not crf.modelfile.auto:
+                # a CRF of a native model file only references the file when pickled, pickle a copy owning the model (a temp file)
+                from sklearn_crfsuite import CRF
+                crf=CRF(**{**crf.get_params(), 'model_filename': None})
+                crf.modelfile.refresh()
+                shutil.copyfile(self.crf.modelfile.name, crf.modelfile.name)
+            with open(model_path, 'wb') as f:
+                pickle.dump(crf, f)
         self.model_path=model_path
         logger.info(f"Saved model to '{model_path}'")
 
     def load_model(self):
-        with open(self.model_path, 'rb') as f:
-            self.crf = pickle.load(f)
+        if self.model_path.endswith(self.NATIVE_MODEL_EXTENSION):
+            if not os.path.exists(self.model_path):
+                raise FileNotFoundError(f"Model file {self.model_path} does not exist.")
+            # sklearn_crfsuite pulls in sklearn, import it when a model is needed (not with poslog)
+            from sklearn_crfsuite import CRF
+            # crfsuite reads the file directly (no unpickling, no copy to a temp file)
+            self.crf = CRF(model_filename=self.model_path)
+            self.crf.tagger_
+        else:
+            with open(self.model_path, 'rb') as f:
+                self.crf = pickle.load(f)
+        self.clear_cache()
+
+    def prune_model(self, model:str, min_weight:float=0.0, min_count:int=0, X_train_tokens:list[list[str]]=None)->str:
+        """ Writes a smaller native model (path or name) without the features of |weight|<min_weight and, given the training corpus,
+        without the state features of attributes occurring less than min_count times in it. Returns the path of the new model. """
+        from poslog.CRFSuiteModel import CRFSuiteModel
+        if self.crf is None:
+            self.load_model()
+        model_path=self._get_model_path(model)
+        if not model_path.endswith(self.NATIVE_MODEL_EXTENSION):
+            model_path=os.path.splitext(model_path)[0]+self.NATIVE_MODEL_EXTENSION
+        if self._is_default_model_path(model_path):
+            raise ValueError("Won't overwrite the default model, provide another model path.")
+        counts=None
+        if min_count>0:
+            if X_train_tokens is None:
+                raise ValueError("min_count needs the training corpus (X_train_tokens).")
+            counts=CRFSuiteModel.count_attributes(self.make_features_corpus(X_train_tokens))
+        original=CRFSuiteModel.from_crf(self.crf)
+        pruned=original.prune(min_weight, min_count, counts)
+        pruned.write(model_path)
+        logger.info(f"Pruned model '{self.model_path}' ({len(original)} features) to '{model_path}' ({len(pruned)} features)")
+        return model_path
+
+    def export_numpy(self, sparse:bool=False)->'NumpyCRF':
+        """ Weights of the current model (loaded if needed) as NumPy arrays for batched decoding and marginals (see NumpyCRF).
+        Decodes token lists with predict_tokens unless the features come from a custom or overridden make_features (see _has_custom_features),
+        then without encoder: pass the feature dicts of make_features_batch to predict or state_scores. """
+        from poslog.NumpyCRF import NumpyCRF
+        if self.crf is None:
+            self.load_model()
+        return NumpyCRF.from_crf(self.crf, sparse, self._get_attribute_encoder())
+
+    @classmethod
+    def convert_model(cls, model:str=None)->str:
+        """ Converts a pickled model (default: the bundled model) into a native crfsuite model next to it. Returns the path of the new model. """
+        pickle_path=cls._get_model_path(model)
+        if not pickle_path.endswith(cls.PICKLE_MODEL_EXTENSION):
+            pickle_path=os.path.splitext(pickle_path)[0]+cls.PICKLE_MODEL_EXTENSION
+        with open(pickle_path, 'rb') as f:
+            crf:'CRF'=pickle.load(f)
+        native_path=os.path.splitext(pickle_path)[0]+cls.NATIVE_MODEL_EXTENSION
+        shutil.copyfile(crf.modelfile.name, native_path)
+        logger.info(f"Converted model '{pickle_path}' to '{native_path}'")
+        return native_path
+
+    def enable_stats(self, stats:PosLogStats=None)->PosLogStats:
+        """ Records the latency of the stages from now on (a new PosLogStats or the given one), see PosLogStats for the snapshot and dumps.
+        Stages: predict, predict_batch, predict_string, predict_strings (the calls incl. result cache hits), tokenize, make_features
+        (feature dicts or crfsuite attributes), decode (crfsuite), known_words and token_class (per word on misses of the feature cache). """
+        self.stats=stats if stats is not None else PosLogStats()
+        self.feature_extractor.stats=self.stats
+        return self.stats
+
+    def disable_stats(self)->None:
+        self.stats=None
+        self.feature_extractor.stats=None
+
+    def clear_cache(self)->None:
+        """ Drops all cached results, e.g. after the model changed. """
+        if self.result_cache is not None:
+            self.result_cache.clear()
+
+    def clear_feature_cache(self)->None:
+        """ Drops all cached static features, e.g. after the known words changed. """
+        self.feature_extractor.clear_cache()
+        if self.attribute_encoder is not None:
+            self.attribute_encoder.clear_cache()
+        self.clear_cache()
 
     def pos_tag(self,tokens:list[str], tagset='upos')->list[str]:
         match tagset:
@@ -81,127 +257,266 @@ class PosLogCRF(AbstractPosTagger):
                 raise ValueError(f"Unknown tagset: {tagset}")
     
     def predict(self, X:list[str])->list[str]:
+        if self.stats is None:
+            return self._predict_cached(X)
+        time_start=time.perf_counter()
+        tags=self._predict_cached(X)
+        self.stats.record('predict', time.perf_counter()-time_start, len(X), 1)
+        return tags
+
+    def _predict_cached(self, X:list[str])->list[str]:
+        if self.result_cache is not None:
+            key=tuple(X)
+            tags=self.result_cache.get(key)
+            if tags is not None:
+                return list(tags)
+        tags=self._predict(X)
+        if self.result_cache is not None:
+            self.result_cache.put(key, tuple(tags))
+        return tags
+
+    def _predict(self, X:list[str])->list[str]:
         if self.crf is None:
             self.load_model()
+        encoder=self._get_attribute_encoder()
+        if self.stats is not None:
+            return self._predict_batch_timed([X], encoder)[0]
+        if encoder is not None:
+            return self.crf.tagger_.tag(encoder.encode(X))
         feat=self.make_features(X)
         return list(self.crf.predict([feat])[0])
 
+    def predict_batch(self, X:list[list[str]])->list[list[str]]:
+        """ Predicts tags for a batch of token lists in one pass. Static token features are computed once per unique token of the batch. """
+        if self.stats is None:
+            return self._predict_batch_cached(X)
+        time_start=time.perf_counter()
+        tags=self._predict_batch_cached(X)
+        self.stats.record('predict_batch', time.perf_counter()-time_start, sum(len(x) for x in X), len(X))
+        return tags
+
+    def _predict_batch_cached(self, X:list[list[str]])->list[list[str]]:
+        if self.result_cache is None:
+            return self._predict_batch(X)
+        def compute(keys:list[tuple[str,...]])->list[tuple[str,...]]:
+            return [tuple(tags) for tags in self._predict_batch([list(key) for key in keys])]
+        results=self._cached_batch([tuple(x) for x in X], compute)
+        return [list(tags) for tags in results]
+
+    def _predict_batch(self, X:list[list[str]])->list[list[str]]:
+        if self.crf is None:
+            self.load_model()
+        encoder=self._get_attribute_encoder()
+        if self.stats is not None:
+            return self._predict_batch_timed(X, encoder)
+        if encoder is not None:
+            tagger=self.crf.tagger_
+            return [tagger.tag(attributes) for attributes in encoder.encode_batch(X)]
+        feats=self.make_features_batch(X)
+        return [list(y) for y in self.crf.predict(feats)]
+
+    def _predict_batch_timed(self, X:list[list[str]], encoder:AttributeEncoder|None)->list[list[str]]:
+        """ _predict_batch recording the stages make_features and decode. """
+        tokens=sum(len(x) for x in X)
+        time_start=time.perf_counter()
+        if encoder is not None:
+            attributes_batch=encoder.encode_batch(X)
+            time_features=time.perf_counter()
+            self.stats.record('make_features', time_features-time_start, tokens)
+            tagger=self.crf.tagger_
+            tags=[tagger.tag(attributes) for attributes in attributes_batch]
+        else:
+            # make_features_batch records itself
+            feats=self.make_features_batch(X)
+            time_features=time.perf_counter()
+            tags=[list(y) for y in self.crf.predict(feats)]
+        self.stats.record('decode', time.perf_counter()-time_features, tokens)
+        return tags
+
+    def predict_batch_confidence(self, X:list[list[str]])->tuple[list[list[str]],list[list[float]]]:
+        """ Tags of predict_batch and the marginal probability of each tag (as CRF.predict_marginals), e.g. to pass on lines the model is unsure about.
+        Decoded by NumpyCRF, from the feature dicts if make_features is custom or overridden, not cached in the result cache. """
+        import numpy as np
+        if self.crf is None:
+            self.load_model()
+        if self._numpy_crf is None or self._numpy_crf_crf is not self.crf:
+            self._numpy_crf=self.export_numpy()
+            self._numpy_crf_crf=self.crf
+        numpy_crf=self._numpy_crf
+        if self._has_custom_features() or numpy_crf.encoder is None:
+            scores=numpy_crf.state_scores(self.make_features_batch(X))
+        else:
+            scores=numpy_crf.token_state_scores(X)
+        tags=numpy_crf.decode(scores)
+        label_index={label: i for i, label in enumerate(numpy_crf.labels)}
+        confidences=[marginals[np.arange(len(y)), [label_index[tag] for tag in y]].tolist() for y, marginals in zip(tags, numpy_crf.marginals(scores))]
+        return tags, confidences
+
+    def _get_attribute_encoder(self)->AttributeEncoder|None:
+        """ Encoder of the features of the current model, None for features of a custom make_features. """
+        if self._has_custom_features():
+            return None
+        if self.attribute_encoder is None or self._attribute_encoder_crf is not self.crf:
+            from poslog.CRFSuiteModel import CRFSuiteModel
+            known_attributes=frozenset(CRFSuiteModel.read_attributes(self.crf.modelfile.name))
+            self.attribute_encoder=AttributeEncoder(self.feature_extractor, known_attributes, self.feature_cache_size)
+            self._attribute_encoder_crf=self.crf
+        return self.attribute_encoder
+
+    def _has_custom_features(self)->bool:
+        """ Whether the features do not come from FeatureExtractor itself: a make_features passed to the constructor,
+        or an override of make_features in a subclass of PosLogCRF or of make_features (or _make_features) in a subclass of FeatureExtractor. """
+        if self._custom_make_features or type(self).make_features is not PosLogCRF.make_features:
+            return True
+        extractor_type=type(self.feature_extractor)
+        return extractor_type.make_features is not FeatureExtractor.make_features or extractor_type._make_features is not FeatureExtractor._make_features
+
+    def _cached_batch(self, keys:list, compute)->list:
+        """ Looks up keys in the result cache and computes each missing key only once via compute(list_of_keys). """
+        results=[self.result_cache.get(key) for key in keys]
+        todo=list(dict.fromkeys(key for key, result in zip(keys, results) if result is None))
+        if todo:
+            computed=dict(zip(todo, compute(todo)))
+            for key, value in computed.items():
+                self.result_cache.put(key, value)
+            results=[computed[key] if result is None else result for key, result in zip(keys, results)]
+        return results
+
     def predict_string(self, X:str)->list[str]:
-        if self.tokenizer is None:
-            self.tokenizer=PosLogTokenizer()
-        tokens=self.tokenizer.tokenize(X)
-        return self.predict(tokens)
+        _, tags=self._predict_string(X)
+        return tags
 
     def predict_string_as_tuple(self, X:str)->list[tuple[str,str]]:
+        tokens, tags=self._predict_string(X)
+        return list(zip(tokens, tags))
+
+    def _predict_string(self, X:str)->tuple[list[str],list[str]]:
+        if self.stats is None:
+            return self._predict_string_cached(X)
+        time_start=time.perf_counter()
+        tokens, tags=self._predict_string_cached(X)
+        self.stats.record('predict_string', time.perf_counter()-time_start, len(tokens), 1)
+        return tokens, tags
+
+    def _predict_string_cached(self, X:str)->tuple[list[str],list[str]]:
+        if self.result_cache is not None:
+            cached=self.result_cache.get(X)
+            if cached is not None:
+                return list(cached[0]), list(cached[1])
         if self.tokenizer is None:
             self.tokenizer=PosLogTokenizer()
-        tokens=self.tokenizer.tokenize(X)
-        tags=self.predict(tokens)
-        return list(zip(tokens, tags))
+        tokens=self.tokenizer.tokenize(X) if self.stats is None else self._tokenize_timed([X])[0]
+        tags=self._predict(tokens)
+        if self.result_cache is not None:
+            self.result_cache.put(X, (tuple(tokens), tuple(tags)))
+        return tokens, tags
+
+    def predict_string_spans(self, X:str)->list[tuple[str,str,int,int]]:
+        """ (token, tag, start, end) per token, X[start:end] is the text of the token (see PosLogTokenizer.tokenize_with_spans()). """
+        if self.tokenizer is None:
+            self.tokenizer=PosLogTokenizer()
+        spans=self.tokenizer.tokenize_with_spans(X)
+        tags=self.predict([token for token, _, _ in spans])
+        return [(token, tag, start, end) for (token, start, end), tag in zip(spans, tags)]
+
+    def predict_strings(self, X:list[str])->list[list[str]]:
+        _, tags=self._predict_strings(X)
+        return tags
+
+    def predict_strings_as_tuple(self, X:list[str])->list[list[tuple[str,str]]]:
+        tokens, tags=self._predict_strings(X)
+        return [list(zip(t, y)) for t, y in zip(tokens, tags)]
+
+    def _predict_strings(self, X:list[str])->tuple[list[list[str]],list[list[str]]]:
+        if self.stats is None:
+            return self._predict_strings_cached(X)
+        time_start=time.perf_counter()
+        tokens, tags=self._predict_strings_cached(X)
+        self.stats.record('predict_strings', time.perf_counter()-time_start, sum(len(t) for t in tokens), len(X))
+        return tokens, tags
+
+    def _predict_strings_cached(self, X:list[str])->tuple[list[list[str]],list[list[str]]]:
+        if self.tokenizer is None:
+            self.tokenizer=PosLogTokenizer()
+        if self.result_cache is None:
+            tokens=[self.tokenizer.tokenize(x) for x in X] if self.stats is None else self._tokenize_timed(X)
+            return tokens, self._predict_batch(tokens)
+        def compute(lines:list[str])->list[tuple[tuple[str,...],tuple[str,...]]]:
+            tokens=[self.tokenizer.tokenize(line) for line in lines] if self.stats is None else self._tokenize_timed(lines)
+            tags=self._predict_batch(tokens)
+            return [(tuple(t), tuple(y)) for t, y in zip(tokens, tags)]
+        results=self._cached_batch(X, compute)
+        return [list(t) for t, _ in results], [list(y) for _, y in results]
+
+    def _tokenize_timed(self, X:list[str])->list[list[str]]:
+        """ Tokens per line, recorded as stage tokenize. """
+        time_start=time.perf_counter()
+        tokens=[self.tokenizer.tokenize(x) for x in X]
+        self.stats.record('tokenize', time.perf_counter()-time_start, sum(len(t) for t in tokens), len(X))
+        return tokens
+
+    def predict_strings_spans(self, X:list[str])->list[list[tuple[str,str,int,int]]]:
+        """ predict_string_spans() for a batch of lines in one pass. """
+        if self.tokenizer is None:
+            self.tokenizer=PosLogTokenizer()
+        spans=[self.tokenizer.tokenize_with_spans(x) for x in X]
+        tags=self.predict_batch([[token for token, _, _ in line_spans] for line_spans in spans])
+        return [[(token, tag, start, end) for (token, start, end), tag in zip(line_spans, line_tags)] for line_spans, line_tags in zip(spans, tags)]
 
 
     def make_features(self, words:list[str])->list[dict[str,str]]:
-        features_list=[]
-        for i, word in enumerate(words):
-
-            features = {}
-
-            features['word']=word
-
-            kind_of_known_word = self.kwdet.kind_of_known_word(word)
-            features['is_stopword'] = 1 if kind_of_known_word == WordKind.STOP_WORD else 0
-            #features['is_wordnet'] = 1 if kind_of_known_word == WordKind.WORD_NET else 0
-            features['is_wordnet'] = 1 if kind_of_known_word == WordKind.WORD_NET or kind_of_known_word == WordKind.WORDS_DICTIONARY else 0
-            features['is_domain_word'] = 1 if kind_of_known_word == WordKind.DOMAIN_WORD else 0
-            features['is_number'] = 1 if kind_of_known_word == WordKind.NUMBER else 0
-            features['is_unknown'] = 1 if kind_of_known_word == WordKind.UNKNOWN else 0
-
-            token_class:TokenClass = self.rgtcm.token_class(word)
-            features['word_class'] = token_class.value
-
-            features['has_upper'] = 1 if re.search(r'[A-Z]',word) else 0
-
-            path_regex=re.compile(r'\w*:?([\.\/\\]+[\w\-:]+)+')
-            features['is-path']=1 if path_regex.fullmatch(word) else 0
-
-            # For better distinguish between 'to' as ADP and PART
-            features['is_to']=1 if word.lower() == 'to' else 0
-
-            features['contains_number'] = 1 if re.search(r'[0-9]',word) else 0
-            
-            features['contains_punct']=1 if re.search(r'['+string.punctuation+']',word) else 0
-
-            # ideas from: https://www.geeksforgeeks.org/conditional-random-fields-crfs-for-pos-tagging-in-nlp/
-            features['is_first'] = i == 0
-            features['is_last'] = i == len(words) - 1
-
-            features['all_caps'] = 1 if word.upper() == word else 0
-            features['all_lower'] = 1 if word.lower() == word else 0
-
-            # Next word to better distinguish between 'to' as ADP and PART
-            features['next_word']= '' if i == len(words)-1 else words[i+1]
-            
-            features['prev_char']= '' if i == 0 else words[i-1][-1]
-            features['next_char']= '' if i == len(words)-1 else words[i+1][0]
-
-            features['prefix-1'] = word[0]
-            features['prefix-2'] = word[:2]
-
-            features['suffix-1'] = word[-1]
-            features['suffix-2'] = word[-2:]
-            features['suffix-3'] = word[-3:]
-            
-            
-            word_lower = word.lower()
-            features['word.lower'] = word_lower
-
-            # Prefixes and suffixes — useful for ADJ
-            features['suffix3'] = word_lower[-3:]
-            features['suffix2'] = word_lower[-2:]
-            features['prefix2'] = word_lower[:2]
-            features['prefix3'] = word_lower[:3]
-
-            # Punctuation — useful to catch INTJ
-            features['is_punct'] = str(word in "!?.;,")
-
-            # Position-aware features
-            if i > 0:
-                features['prev_word'] = words[i - 1].lower()
-                features['prev_is_upper'] = str(words[i - 1].isupper())
-            if i < len(words) - 1:
-                # features['next_word'] = words[i + 1].lower()
-                features['next_is_upper'] = str(words[i + 1].isupper())
-
-            # Shape-based features
-            features['word_shape'] = get_shape(word)
-
-            # particles = {'not', 'off', 'up', 'down'}
-            # interjections = {'oh', 'ah', 'wow', 'hey', 'oops', 'ouch', 'ok', 'bye', 'yes'}
-            adjective_suffixes = ('ous', 'ful', 'ive', 'able', 'al', 'ic', 'less', 'ish')
-
-            features['adj_suffix_match'] = str(any(word_lower.endswith(suf) for suf in adjective_suffixes))
-
-            noun_suffixes = ('tion', 'ment', 'ness', 'ity', 'ship', 'age', 'ism', 'ence', 'ance', 'hood', 'dom')
-            features['noun_suffix'] = str(any(word_lower.endswith(suf) for suf in noun_suffixes))
-
-            # e.g., "the big ___" → likely NOUN
-            determiners = {'the', 'a', 'an', 'this', 'that', 'these', 'those'}
-            features['prev_is_determiner'] = str(i > 0 and words[i-1].lower() in determiners)
-
-            features_list.append(features)
-        
-        return features_list        
-
-def get_shape(word: str) -> str:
-    shape = ''
-    for char in word:
-        if char.isupper():
-            shape += 'X'
-        elif char.islower():
-            shape += 'x'
-        elif char.isdigit():
-            shape += 'd'
-        else:
-            #shape += '_'
-            shape += char
-    return shape
+        if self.stats is None:
+            return self.feature_extractor.make_features(words)
+        time_start=time.perf_counter()
+        features=self.feature_extractor.make_features(words)
+        self.stats.record('make_features', time.perf_counter()-time_start, len(words))
+        return features
+
+    def make_features_batch(self, sents:list[list[str]])->list[list[dict[str,str]]]:
+        """ Featurizes a batch of token lists. Static token features are shared across the batch (and across calls if the feature cache is enabled). """
+        if self.stats is None:
+            return self._make_features_batch(sents)
+        time_start=time.perf_counter()
+        features=self._make_features_batch(sents)
+        self.stats.record('make_features', time.perf_counter()-time_start, sum(len(s) for s in sents))
+        return features
+
+    def _make_features_batch(self, sents:list[list[str]])->list[list[dict[str,str]]]:
+        if not self._has_custom_features():
+            return self.feature_extractor.make_features_batch(sents)
+        # one by one through the override, make_features of PosLogCRF itself only delegates to the (overriding) extractor and would record its stats twice
+        make_features=self.make_features
+        if getattr(make_features, '__func__', None) is PosLogCRF.make_features:
+            make_features=self.feature_extractor.make_features
+        return [make_features(s) for s in sents]
+
+    def make_features_corpus(self, sents:list[list[str]], n_jobs:int=1)->list[list[dict[str,str]]]:
+        """ Featurizes a training corpus on n_jobs processes (None: all CPUs).
+        With the feature disk cache, a corpus featurized before by the same feature set is loaded instead. """
+        key=None
+        if self.feature_disk_cache is not None:
+            version=self.features_fingerprint()
+            if version is None:
+                logger.warning("Source of make_features is not available, features are not cached on disk.")
+            else:
+                key=self.feature_disk_cache.key(sents, version)
+                features=self.feature_disk_cache.get(key)
+                if features is not None:
+                    return features
+        features=make_features_parallel(self.make_features_batch, sents, n_jobs)
+        if key is not None:
+            self.feature_disk_cache.put(key, features)
+        return features
+
+    def features_fingerprint(self)->str|None:
+        """ Version of the features: FeatureExtractor.fingerprint (incl. overrides in its subclasses), or the hash of the source of a custom make_features
+        (its module, for an override in a subclass of PosLogCRF combined with the extractor's fingerprint; state outside the source, e.g. loaded word lists, is not covered). """
+        if self._custom_make_features:
+            return source_fingerprint(self.make_features)
+        extractor_fingerprint=self.feature_extractor.fingerprint()
+        if type(self).make_features is PosLogCRF.make_features:
+            return extractor_fingerprint
+        override_fingerprint=source_fingerprint(type(self))
+        if override_fingerprint is None or extractor_fingerprint is None:
+            return None
+        return hashlib.sha256(f"{override_fingerprint}\0{extractor_fingerprint}".encode('utf-8')).hexdigest()
@@ -0,0 +1,87 @@
+import http.client
+import json
+import socket
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path:str, timeout:float=None):
+        super().__init__('localhost', timeout=timeout)
+        self.unix_socket=path
+
+    def connect(self):
+        self.sock=socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_socket)
+
+class PosLogClient:
+    """ Thin client of PosLogServer with the prediction API of PosLogCRF.
+    Uses one keep-alive connection, so use one client per thread. """
+
+    def __init__(self, address:str='127.0.0.1:8088', timeout:float=60.0):
+        """ address: 'host:port' or 'unix:/path/to/socket' """
+        self.address=address
+        self.timeout=timeout
+        self._connection:http.client.HTTPConnection=None
+
+    def _connect(self)->http.client.HTTPConnection:
+        if self.address.startswith('unix:'):
+            return _UnixHTTPConnection(self.address[len('unix:'):], timeout=self.timeout)
+        host, port=self.address.rsplit(':', 1)
+        return http.client.HTTPConnection(host, int(port), timeout=self.timeout)
+
+    def close(self)->None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection=None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _request(self, method:str, path:str, body:dict=None)->dict:
+        data=json.dumps(body).encode('utf-8') if body is not None else None
+        headers={'Content-Type': 'application/json'} if data is not None else {}
+        # retry once on a connection closed by the server
+        for retry in (True, False):
+            if self._connection is None:
+                self._connection=self._connect()
+            try:
+                self._connection.request(method, path, body=data, headers=headers)
+                response=self._connection.getresponse()
+                result=json.loads(response.read())
+                break
+            except (ConnectionError, http.client.HTTPException):
+                self.close()
+                if not retry:
+                    raise
+        if response.status!=200:
+            raise RuntimeError(f"PosLog server error {response.status}: {result.get('error')}")
+        return result
+
+    def health(self)->bool:
+        try:
+            return self._request('GET', '/health').get('status')=='ok'
+        except OSError:
+            return False
+
+    def stats(self)->dict[str,int]:
+        return self._request('GET', '/stats')
+
+    def reload(self)->dict[str,dict[str,int]]:
+        """ Makes the server read its domain words files again, returns the number of words per source. """
+        return self._request('POST', '/reload', {})
+
+    def predict_strings_as_tuple(self, X:list[str])->list[list[tuple[str,str]]]:
+        results=self._request('POST', '/predict', {'lines': X})['results']
+        return [[(token, tag) for token, tag in result] for result in results]
+
+    def predict_strings(self, X:list[str])->list[list[str]]:
+        return [[tag for _, tag in result] for result in self.predict_strings_as_tuple(X)]
+
+    def predict_string_as_tuple(self, X:str)->list[tuple[str,str]]:
+        return self.predict_strings_as_tuple([X])[0]
+
+    def predict_string(self, X:str)->list[str]:
+        return [tag for _, tag in self.predict_string_as_tuple(X)]
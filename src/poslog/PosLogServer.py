@@ -0,0 +1,255 @@
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+
+from poslog.PosLogCRF import PosLogCRF
+
+import logging
+logger = logging.getLogger(__name__)
+
+######################
+# Batcher
+######################
+
+# queue item of a reload of the domain words, (RELOAD, future) instead of (lines, future)
+_RELOAD=object()
+
+class _Batcher(threading.Thread):
+    """ Single tagging thread. Requests arriving while a batch is tagged are coalesced into the next batch.
+    Reloads of the domain words run on this thread too, between two batches, so no batch mixes (or caches results of) old and new words. """
+
+    def __init__(self, pos_log:PosLogCRF, max_batch:int, max_wait:float):
+        super().__init__(name='PosLogBatcher', daemon=True)
+        self.pos_log=pos_log
+        self.max_batch=max_batch
+        self.max_wait=max_wait
+        self.queue:queue.Queue[tuple[list[str]|object,Future]|None]=queue.Queue()
+        self.batches=0
+        self.requests=0
+        self.lines=0
+
+    def submit(self, lines:list[str])->Future:
+        future=Future()
+        self.queue.put((lines, future))
+        return future
+
+    def submit_reload(self)->Future:
+        """ Reads the domain words files again after the current batch, the future's result is the number of words per source. """
+        future=Future()
+        self.queue.put((_RELOAD, future))
+        return future
+
+    def stop(self)->None:
+        self.queue.put(None)
+
+    def _collect(self, first:tuple[list[str],Future])->tuple[list[tuple[list[str],Future]],bool,tuple[object,Future]|None]:
+        """ Collects queued requests up to max_batch lines, waits at most max_wait for more.
+        Returns the requests, whether to stop and a reload that ended the collection (to run after the batch). """
+        requests=[first]
+        n=len(first[0])
+        deadline=time.monotonic()+self.max_wait
+        while n<self.max_batch:
+            try:
+                timeout=deadline-time.monotonic()
+                item=self.queue.get(timeout=timeout) if timeout>0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return requests, True, None
+            if item[0] is _RELOAD:
+                return requests, False, item
+            requests.append(item)
+            n+=len(item[0])
+        return requests, False, None
+
+    def run(self)->None:
+        stop=False
+        reload=None
+        while not stop:
+            if reload is not None:
+                self._reload(reload[1])
+                reload=None
+            item=self.queue.get()
+            if item is None:
+                break
+            if item[0] is _RELOAD:
+                self._reload(item[1])
+                continue
+            requests, stop, reload=self._collect(item)
+            lines=[line for request_lines, _ in requests for line in request_lines]
+            try:
+                results=self.pos_log.predict_strings_as_tuple(lines)
+            except Exception as e:
+                logger.exception("Tagging failed")
+                for _, future in requests:
+                    future.set_exception(e)
+                continue
+            self.batches+=1
+            self.requests+=len(requests)
+            self.lines+=len(lines)
+            i=0
+            for request_lines, future in requests:
+                future.set_result(results[i:i+len(request_lines)])
+                i+=len(request_lines)
+
+    def _reload(self, future:Future)->None:
+        kwdet=self.pos_log.kwdet
+        try:
+            kwdet.reload_domain_words()
+        except Exception as e:
+            logger.warning(f"Reloading the domain words failed: {e}")
+            future.set_exception(e)
+            return
+        future.set_result({source: len(words) for source, words in kwdet.domain_word_sources.items()})
+
+######################
+# HTTP
+######################
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    # keep-alive connections
+    protocol_version='HTTP/1.1'
+
+    def setup(self):
+        # headers and body are written separately, avoid delayed ACKs on tcp connections
+        self.disable_nagle_algorithm=self.request.family!=socket.AF_UNIX
+        super().setup()
+
+    def _send_json(self, status:int, body:dict)->None:
+        data=json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_text(self, status:int, text:str, content_type:str='text/plain; charset=utf-8')->None:
+        data=text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        batcher:_Batcher=self.server.batcher
+        match self.path:
+            case '/health':
+                self._send_json(200, {'status': 'ok'})
+            case '/stats':
+                stats={'batches': batcher.batches, 'requests': batcher.requests, 'lines': batcher.lines}
+                if self.server.pos_log.stats is not None:
+                    stats['pos_log']=self.server.pos_log.stats.snapshot()
+                self._send_json(200, stats)
+            case '/metrics':
+                if self.server.pos_log.stats is None:
+                    self._send_json(404, {'error': "Stats are disabled, start the server with stats enabled."})
+                else:
+                    self._send_text(200, self.server.pos_log.stats.to_prometheus(), 'text/plain; version=0.0.4; charset=utf-8')
+            case _:
+                self._send_json(404, {'error': f"Unknown path: {self.path}"})
+
+    def do_POST(self):
+        if self.path=='/reload':
+            self._reload()
+            return
+        if self.path!='/predict':
+            self._send_json(404, {'error': f"Unknown path: {self.path}"})
+            return
+        try:
+            length=int(self.headers.get('Content-Length', 0))
+            lines=json.loads(self.rfile.read(length))['lines']
+            if not isinstance(lines, list) or not all(isinstance(line, str) for line in lines):
+                raise ValueError("'lines' must be a list of strings")
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        try:
+            results=self.server.batcher.submit(lines).result()
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+            return
+        self._send_json(200, {'results': results})
+
+    def _reload(self)->None:
+        """ Reads the domain words files again on the tagging thread, between two batches. """
+        # drain the (unused) body, the connection is kept alive
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        try:
+            domain_words=self.server.batcher.submit_reload().result()
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+            return
+        self._send_json(200, {'domain_words': domain_words})
+
+    def address_string(self)->str:
+        # unix sockets have no client address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+class _ThreadingUnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads=True
+
+######################
+# Server
+######################
+
+class PosLogServer:
+    """ Long-running tagging server keeping PosLogCRF (model, known words, regexes) warm.
+    Serves HTTP on localhost or on a unix socket:
+    POST /predict {"lines": [...]} -> {"results": [[[token, tag], ...], ...]}, POST /reload (domain words files), GET /health, GET /stats,
+    GET /metrics (Prometheus text of PosLogStats, with stats=True). """
+
+    DEFAULT_HOST='127.0.0.1'
+    DEFAULT_PORT=8088
+
+    def __init__(self, host:str=DEFAULT_HOST, port:int=DEFAULT_PORT, unix_socket:str=None, max_batch:int=512, max_wait:float=0.0, **pos_log_kwargs):
+        """ max_batch: max. lines per tagging batch, max_wait: seconds to wait for more requests to coalesce (0: only coalesce already queued requests). """
+        self.pos_log=PosLogCRF(**pos_log_kwargs)
+        self.pos_log.load_model()
+        # warm up lazy loaded resources (tokenizer, wordnet)
+        self.pos_log.predict_strings_as_tuple(["Warm up PosLog."])
+        if self.pos_log.stats is not None:
+            self.pos_log.stats.reset()
+        self.batcher=_Batcher(self.pos_log, max_batch, max_wait)
+
+        self.unix_socket=unix_socket
+        if unix_socket is not None:
+            if os.path.exists(unix_socket):
+                os.unlink(unix_socket)
+            self.httpd=_ThreadingUnixHTTPServer(unix_socket, _RequestHandler)
+            self.address=f"unix:{unix_socket}"
+        else:
+            self.httpd=ThreadingHTTPServer((host, port), _RequestHandler)
+            self.httpd.daemon_threads=True
+            self.address=f"{host}:{self.httpd.server_address[1]}"
+        self.httpd.batcher=self.batcher
+        self.httpd.pos_log=self.pos_log
+
+    def serve_forever(self)->None:
+        self.batcher.start()
+        logger.info(f"PosLog server listening on {self.address}")
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.batcher.stop()
+            self.httpd.server_close()
+            if self.unix_socket is not None and os.path.exists(self.unix_socket):
+                os.unlink(self.unix_socket)
+
+    def start(self)->threading.Thread:
+        """ Serves in a background thread. """
+        thread=threading.Thread(target=self.serve_forever, name='PosLogServer', daemon=True)
+        thread.start()
+        return thread
+
+    def shutdown(self)->None:
+        self.httpd.shutdown()
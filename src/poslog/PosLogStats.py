@@ -0,0 +1,84 @@
+from bisect import bisect_left
+import json
+import threading
+
+class PosLogStats:
+    """ Opt-in latency statistics of PosLog's stages: count, cumulative time and a latency histogram per stage, plus tokens and lines.
+    Stages are recorded by PosLogCRF (see PosLogCRF.enable_stats) and its FeatureExtractor; thread-safe. """
+
+    # stages whose tokens and lines are tagged ones (the others run inside them)
+    TAGGING_STAGES=('predict', 'predict_batch', 'predict_string', 'predict_strings')
+    # upper bounds of the histogram buckets in seconds, from a word lookup to a large batch
+    BUCKETS=(1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, buckets:tuple[float,...]=None):
+        self.buckets:tuple[float,...]=tuple(sorted(buckets)) if buckets is not None else self.BUCKETS
+        self._lock=threading.Lock()
+        # stage -> [count, seconds, tokens, lines, counts per bucket (the last one above all bounds)]
+        self._stages:dict[str,list]={}
+
+    def record(self, stage:str, seconds:float, tokens:int=0, lines:int=0)->None:
+        bucket=bisect_left(self.buckets, seconds)
+        with self._lock:
+            entry=self._stages.get(stage)
+            if entry is None:
+                entry=self._stages[stage]=[0, 0.0, 0, 0, [0]*(len(self.buckets)+1)]
+            entry[0]+=1
+            entry[1]+=seconds
+            entry[2]+=tokens
+            entry[3]+=lines
+            entry[4][bucket]+=1
+
+    def reset(self)->None:
+        with self._lock:
+            self._stages.clear()
+
+    def snapshot(self)->dict:
+        """ Copy of the current values: {'tokens', 'lines', 'stages': {stage: {'count', 'seconds', 'mean_seconds', 'tokens', 'lines', 'buckets'}}}.
+        buckets are the counts per upper bound (non-cumulative), the last one ('inf') above all bounds. """
+        with self._lock:
+            stages={stage: (count, seconds, tokens, lines, list(buckets)) for stage, (count, seconds, tokens, lines, buckets) in self._stages.items()}
+        bounds=[str(bound) for bound in self.buckets]+['inf']
+        return {
+            'tokens': sum(stages[stage][2] for stage in self.TAGGING_STAGES if stage in stages),
+            'lines': sum(stages[stage][3] for stage in self.TAGGING_STAGES if stage in stages),
+            'stages': {stage: {
+                'count': count,
+                'seconds': seconds,
+                'mean_seconds': seconds/count if count>0 else 0.0,
+                'tokens': tokens,
+                'lines': lines,
+                'buckets': dict(zip(bounds, buckets)),
+            } for stage, (count, seconds, tokens, lines, buckets) in stages.items()},
+        }
+
+    def to_json(self, **kwargs)->str:
+        """ snapshot() as JSON, kwargs are passed to json.dumps. """
+        return json.dumps(self.snapshot(), **kwargs)
+
+    def to_prometheus(self, prefix:str='poslog')->str:
+        """ snapshot() in the Prometheus text exposition format: a histogram of the stage latencies and counters of tokens and lines. """
+        snapshot=self.snapshot()
+        out=[
+            f"# HELP {prefix}_tokens_total Tokens tagged.",
+            f"# TYPE {prefix}_tokens_total counter",
+            f"{prefix}_tokens_total {snapshot['tokens']}",
+            f"# HELP {prefix}_lines_total Lines tagged.",
+            f"# TYPE {prefix}_lines_total counter",
+            f"{prefix}_lines_total {snapshot['lines']}",
+            f"# HELP {prefix}_stage_seconds Latency of the stages.",
+            f"# TYPE {prefix}_stage_seconds histogram",
+        ]
+        for stage, values in snapshot['stages'].items():
+            cumulative=0
+            for bound, count in values['buckets'].items():
+                cumulative+=count
+                le='+Inf' if bound=='inf' else bound
+                out.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            out.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {values["seconds"]!r}')
+            out.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {values["count"]}')
+        out.append(f"# HELP {prefix}_stage_tokens_total Tokens per stage.")
+        out.append(f"# TYPE {prefix}_stage_tokens_total counter")
+        for stage, values in snapshot['stages'].items():
+            out.append(f'{prefix}_stage_tokens_total{{stage="{stage}"}} {values["tokens"]}')
+        return '\n'.join(out)+'\n'
@@ -1,4 +1,3 @@
-from nltk import word_tokenize
 import re
 
 ######################
@@ -129,6 +128,9 @@ class PosLogTokenizer:
             "you've": "you have"
         }.items()
     ]
+    # all contractions as one alternation (in the order above), the index of the matching group is the index of its substitution
+    CONTRACTIONS_PATTERN = re.compile('|'.join('('+regexp.pattern.removeprefix('(?i)')+')' for regexp, _ in CONTRACTIONS), re.IGNORECASE)
+    CONTRACTIONS_SUBSTITUTIONS = [substitution for _, substitution in CONTRACTIONS]
 
     CONTRACTIONS2 = [(re.compile(r"(?i)([^' ])"+k+r'\b'), r'\1 '+v) for k,v in
         {
@@ -142,8 +144,26 @@ class PosLogTokenizer:
             "'d": "would"
         }.items()
     ]
+    # the part each of CONTRACTIONS2 has to find in the lower case line (its letters have no case variants besides ascii upper case)
+    CONTRACTIONS2_ENDINGS = [regexp.pattern.removeprefix(r"(?i)([^' ])").removesuffix(r'\b') for regexp, _ in CONTRACTIONS2]
+
+    LEADING_QUOTATION = re.compile(r"\B'([^' ])")
+    # quotations NLTKWordTokenizer converts to '``' and "''"
+    QUOTATIONS = re.compile(r"``|'{2}|\"")
+
+    def __init__(self, single_pass:bool=True):
+        """ single_pass: log optimized engine with the same tokens as the nltk path. It applies the contractions in one pass and only to lines with an apostrophe,
+        and it skips the sentence splitting of word_tokenize for lines without a possible sentence boundary. """
+        self.single_pass=single_pass
+        self._word_tokenizer=None
+        self._sentence_boundary=None
 
     def tokenize(self, line:str)->list[str]:
+        if self.single_pass:
+            return self.tokenize_single_pass(line)
+        return self.tokenize_nltk(line)
+
+    def tokenize_nltk(self, line:str)->list[str]:
         # only split on spaces (for pos tagging there should be no further split characters since even '=' or ':' could confuse ps tagging)
         #return line.split()
 
@@ -165,7 +185,133 @@ class PosLogTokenizer:
         # Fixing leading quotations
         # nltk keeps single quotes in front of words in case it’s an apostrophe (clitics)
         # we replace this in case it is not between word characters 
-        line=re.sub(re.compile(r"\B'([^' ])"), r" ' \1",line)
+        line=self.LEADING_QUOTATION.sub(r" ' \1",line)
 
+        # nltk is slow to import, import it on first use
+        from nltk import word_tokenize
         return word_tokenize(line)
 
+    def tokenize_single_pass(self, line:str)->list[str]:
+        """ Same tokens as tokenize_nltk(). """
+        return self._word_tokenize(self._rewrite(line))
+
+    def tokenize_with_spans(self, line:str)->list[tuple[str,int,int]]:
+        """ Same tokens as tokenize(), each with its start and end offset in line. line[start:end] is the text a token comes from,
+        which differs from the token for rewritten contractions (e.g. "n't" for 'not', "won't" for 'will'). """
+        offsets=_Offsets(line)
+        text=self._rewrite(line, offsets)
+        tokens=self._word_tokenize(text)
+        return [(token, *offsets.span(start, end)) for token, (start, end) in zip(tokens, self._align_tokens(tokens, text))]
+
+    def _rewrite(self, line:str, offsets:'_Offsets'=None)->str:
+        """ Contractions and leading quotations, offsets follows the rewritten characters back to line. """
+        # every contraction and the leading quotation contain an apostrophe
+        if "'" not in line:
+            return line
+        line=self._substitute_contractions(line, offsets)
+        line_lower=line.lower()
+        for (regexp, substitution), ending in zip(self.CONTRACTIONS2, self.CONTRACTIONS2_ENDINGS):
+            if ending in line_lower:
+                line=self._sub(regexp, substitution, line, offsets)
+        return self._sub(self.LEADING_QUOTATION, r" ' \1", line, offsets)
+
+    def _substitute_contractions(self, line:str, offsets:'_Offsets'=None)->str:
+        """ One pass of CONTRACTIONS_PATTERN, same result as substituting one contraction after the other unless a contraction is directly followed by an apostrophe.
+        Only then the substitutions interact: substituting "'cause" first removes the word boundary of "don't'cause", "he'd've've" becomes "he would've've" and then
+        "he would have've". Such lines are substituted in order. """
+        if any(line.startswith("'", match.end()) for match in self.CONTRACTIONS_PATTERN.finditer(line)):
+            for regexp, substitution in self.CONTRACTIONS:
+                line=self._sub(regexp, substitution, line, offsets)
+            return line
+        return self._sub(self.CONTRACTIONS_PATTERN, lambda match: self.CONTRACTIONS_SUBSTITUTIONS[match.lastindex-1], line, offsets)
+
+    @staticmethod
+    def _sub(pattern:re.Pattern, substitution, line:str, offsets:'_Offsets'=None)->str:
+        if offsets is None:
+            return pattern.sub(substitution, line)
+        return offsets.sub(pattern, substitution, line)
+
+    def _word_tokenize(self, line:str)->list[str]:
+        # nltk is slow to import, import it on first use
+        if self._word_tokenizer is None:
+            from nltk.tokenize import NLTKWordTokenizer
+            from nltk.tokenize.punkt import PunktLanguageVars
+            self._word_tokenizer=NLTKWordTokenizer()
+            self._sentence_boundary=PunktLanguageVars().period_context_re()
+        # punkt only splits at a sentence end character followed by punctuation or whitespace and a token,
+        # without one word_tokenize's only sentence is the line without trailing whitespace
+        if self._sentence_boundary.search(line):
+            from nltk import word_tokenize
+            return word_tokenize(line)
+        return self._word_tokenizer.tokenize(line.rstrip())
+
+    @classmethod
+    def _align_tokens(cls, tokens:list[str], text:str)->list[tuple[int,int]]:
+        """ Offsets of the tokens in text, searched from the end of the previous token. Like NLTKWordTokenizer.span_tokenize,
+        quotation tokens ('``' and "''") take the quotations of text in order since nltk converts double quotes. """
+        quotations=iter(match.group() for match in cls.QUOTATIONS.finditer(text)) if '"' in text or "''" in text else None
+        spans=[]
+        end=0
+        for token in tokens:
+            if quotations is not None and token in ('"', '``', "''"):
+                token=next(quotations)
+            start=text.index(token, end)
+            end=start+len(token)
+            spans.append((start, end))
+        return spans
+
+######################
+# Offsets
+######################
+
+class _Offsets:
+    """ Original offsets (start, end) of each character of a rewritten line. A character of a substitution keeps the offset of the matched character it equals
+    (ignoring case, in order), other characters span the rest of the match and inserted spaces are empty. E.g. "don't" -> "do not": 'not' spans "n't". """
+
+    def __init__(self, line:str):
+        # None while line is unchanged, i.e. the offsets of character i are (i, i+1)
+        self.starts:list[int]=None
+        self.ends:list[int]=None
+        self.length=len(line)
+
+    def sub(self, pattern:re.Pattern, substitution, line:str)->str:
+        """ pattern.sub(substitution, line) keeping track of the offsets. """
+        if self.starts is None:
+            self.starts=list(range(self.length))
+            self.ends=list(range(1, self.length+1))
+        pieces=[]
+        starts=[]
+        ends=[]
+        position=0
+        for match in pattern.finditer(line):
+            match_start, match_end=match.span()
+            pieces.append(line[position:match_start])
+            starts+=self.starts[position:match_start]
+            ends+=self.ends[position:match_start]
+            replacement=substitution(match) if callable(substitution) else match.expand(substitution)
+            pieces.append(replacement)
+            matched=line[match_start:match_end]
+            i=0
+            for c in replacement:
+                if i<len(matched) and c.lower()==matched[i].lower():
+                    starts.append(self.starts[match_start+i])
+                    ends.append(self.ends[match_start+i])
+                    i+=1
+                elif c==' ':
+                    offset=self.starts[match_start+i] if i<len(matched) else self.ends[match_end-1]
+                    starts.append(offset)
+                    ends.append(offset)
+                else:
+                    starts.append(min(self.starts[match_start+i:match_end], default=self.ends[match_end-1]))
+                    ends.append(self.ends[match_end-1])
+            position=match_end
+        pieces.append(line[position:])
+        self.starts=starts+self.starts[position:]
+        self.ends=ends+self.ends[position:]
+        return ''.join(pieces)
+
+    def span(self, start:int, end:int)->tuple[int,int]:
+        """ Original offsets of the rewritten characters start to end. """
+        if self.starts is None:
+            return start, end
+        return min(self.starts[start:end]), max(self.ends[start:end])
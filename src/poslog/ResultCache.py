@@ -0,0 +1,86 @@
+from collections import OrderedDict
+import sys
+
+class ResultCache:
+    """ Bounded LRU cache for prediction results.
+    Least recently used entries are evicted as soon as `max_entries` or `max_bytes` (an estimation of the entries' memory) is exceeded. """
+
+    def __init__(self, max_entries:int=None, max_bytes:int=None):
+        if max_entries is not None and max_entries<=0:
+            raise ValueError(f"max_entries must be positive, got {max_entries}")
+        if max_bytes is not None and max_bytes<=0:
+            raise ValueError(f"max_bytes must be positive, got {max_bytes}")
+        self.max_entries=max_entries
+        self.max_bytes=max_bytes
+        # key -> (value, estimated size in bytes)
+        self._entries:OrderedDict[object, tuple[object,int]]=OrderedDict()
+        self.bytes=0
+        self.hits=0
+        self.misses=0
+        self.evictions=0
+
+    def __len__(self)->int:
+        return len(self._entries)
+
+    def __contains__(self, key)->bool:
+        return key in self._entries
+
+    def get(self, key):
+        """ Returns the cached value or None. """
+        entry=self._entries.get(key)
+        if entry is None:
+            self.misses+=1
+            return None
+        self._entries.move_to_end(key)
+        self.hits+=1
+        return entry[0]
+
+    def __setitem__(self, key, value)->None:
+        self.put(key, value)
+
+    def put(self, key, value)->None:
+        size=_sizeof(key)+_sizeof(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size>self.max_bytes:
+            # would evict everything else and still not fit
+            return
+        old=self._entries.pop(key, None)
+        if old is not None:
+            self.bytes-=old[1]
+        self._entries[key]=(value, size)
+        self.bytes+=size
+        self._evict()
+
+    def _evict(self)->None:
+        while (self.max_entries is not None and len(self._entries)>self.max_entries) \
+                or (self.max_bytes is not None and self.bytes>self.max_bytes):
+            _, (_, size)=self._entries.popitem(last=False)
+            self.bytes-=size
+            self.evictions+=1
+
+    def clear(self)->None:
+        """ Removes all entries. Counters are kept, see reset_stats(). """
+        self._entries.clear()
+        self.bytes=0
+
+    def reset_stats(self)->None:
+        self.hits=0
+        self.misses=0
+        self.evictions=0
+
+    def stats(self)->dict[str,int|float]:
+        lookups=self.hits+self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits/lookups if lookups>0 else 0.0,
+        }
+
+def _sizeof(obj)->int:
+    """ Estimated memory of (nested tuples/lists of) strings. """
+    size=sys.getsizeof(obj)
+    if isinstance(obj, (tuple, list)):
+        size+=sum(_sizeof(o) for o in obj)
+    return size
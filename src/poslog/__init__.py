@@ -1,3 +1,61 @@
-from .PosLogCRF import PosLogCRF
-from .AbstractPosTagger import AbstractPosTagger
-from .PosLogTokenizer import PosLogTokenizer
\ No newline at end of file
+from typing import TYPE_CHECKING
+import importlib
+import sys
+import types
+
+# Components are imported on first access (e.g. 'from poslog import PosLogTokenizer' does not load sklearn),
+# since importing sklearn_crfsuite and nltk takes more than a second.
+_LAZY_IMPORTS={
+    'PosLogCRF': '.PosLogCRF',
+    'AbstractPosTagger': '.AbstractPosTagger',
+    'PosLogTokenizer': '.PosLogTokenizer',
+    'ResultCache': '.ResultCache',
+    'FeatureExtractor': '.FeatureExtractor',
+    'ParallelPosLogTagger': '.ParallelPosLogTagger',
+    'PosLogServer': '.PosLogServer',
+    'PosLogClient': '.PosLogClient',
+    'CRFSuiteModel': '.CRFSuiteModel',
+    'IncrementalTrainer': '.IncrementalTrainer',
+    'FeatureDiskCache': '.FeatureDiskCache',
+    'AttributeEncoder': '.AttributeEncoder',
+    'NumpyCRF': '.NumpyCRF',
+    'PosLogStats': '.PosLogStats',
+}
+
+__all__=list(_LAZY_IMPORTS)
+
+def __getattr__(name:str):
+    if name not in _LAZY_IMPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value=getattr(importlib.import_module(_LAZY_IMPORTS[name], __name__), name)
+    # cache it, __getattr__ is only called for missing attributes
+    globals()[name]=value
+    return value
+
+def __dir__()->list[str]:
+    return sorted(set(globals())|set(__all__))
+
+class _LazyModule(types.ModuleType):
+    def __setattr__(self, name:str, value):
+        # importing a submodule binds it to the package (e.g. poslog.PosLogTokenizer), keep resolving the class of the same name instead
+        if name in _LAZY_IMPORTS and isinstance(value, types.ModuleType):
+            return
+        super().__setattr__(name, value)
+
+sys.modules[__name__].__class__=_LazyModule
+
+if TYPE_CHECKING:
+    from .PosLogCRF import PosLogCRF
+    from .AbstractPosTagger import AbstractPosTagger
+    from .PosLogTokenizer import PosLogTokenizer
+    from .ResultCache import ResultCache
+    from .FeatureExtractor import FeatureExtractor
+    from .ParallelPosLogTagger import ParallelPosLogTagger
+    from .PosLogServer import PosLogServer
+    from .PosLogClient import PosLogClient
+    from .CRFSuiteModel import CRFSuiteModel
+    from .IncrementalTrainer import IncrementalTrainer
+    from .FeatureDiskCache import FeatureDiskCache
+    from .AttributeEncoder import AttributeEncoder
+    from .NumpyCRF import NumpyCRF
+    from .PosLogStats import PosLogStats
@@ -1,16 +1,247 @@
-from poslog import PosLogCRF
+from poslog import PosLogCRF, PosLogTokenizer, ParallelPosLogTagger, PosLogServer, CRFSuiteModel
 
+from collections.abc import Iterable, Iterator
+from itertools import islice
+import argparse
+import gzip
+import io
+import json
+import logging
+import os
 import sys
+import time
+
+USAGE="""python -m poslog 'input log message'
+       python -m poslog --stream [FILE ...] [--format {jsonl,tsv}] [--output FILE] [--batch-size N] [--n-jobs N] [--model MODEL] [--domain-words FILE ...]
+       python -m poslog serve [--host HOST] [--port PORT | --unix-socket PATH] [--max-batch N] [--max-wait-ms MS] [--cache-size N] [--stats] [--model MODEL] [--domain-words FILE ...]
+       python -m poslog build-lexicon [--output PATH] [--verify FILE ...]
+       python -m poslog prune-model --output MODEL [--model MODEL] [--min-weight W] [--min-count N --corpus FILE ...] [--eval FILE ...]"""
+
+######################
+# Streaming
+######################
+
+def read_lines(files:list[str])->Iterator[str]:
+    """ Yields the lines of the given files (stdin for none or '-'), gzip files are decompressed on the fly. """
+    for file in files or ['-']:
+        if file=='-':
+            f=io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', errors='replace')
+        elif file.endswith('.gz'):
+            f=gzip.open(file, 'rt', encoding='utf-8', errors='replace')
+        else:
+            f=open(file, 'r', encoding='utf-8', errors='replace')
+        with f:
+            for line in f:
+                yield line.rstrip('\r\n')
+
+def batched(lines:Iterable[str], batch_size:int)->Iterator[list[str]]:
+    it=iter(lines)
+    return iter(lambda: list(islice(it, batch_size)), [])
+
+def tag_lines(lines:Iterable[str], batch_size:int, n_jobs:int, pos_log_kwargs:dict)->Iterator[list[tuple[str,str]]]:
+    """ Tags lines in micro-batches, yields one result per line in order. """
+    if n_jobs>1:
+        with ParallelPosLogTagger(n_jobs=n_jobs, **pos_log_kwargs) as tagger:
+            yield from tagger.imap_strings_as_tuple(lines, chunk_size=batch_size)
+    else:
+        pos_log=PosLogCRF(**pos_log_kwargs)
+        for batch in batched(lines, batch_size):
+            yield from pos_log.predict_strings_as_tuple(batch)
+
+def format_jsonl(result:list[tuple[str,str]])->str:
+    return json.dumps({'tokens': [token for token, _ in result], 'tags': [tag for _, tag in result]}, ensure_ascii=False)+'\n'
+
+def format_tsv(result:list[tuple[str,str]])->str:
+    # one token per line, messages separated by an empty line
+    return ''.join(f"{token}\t{tag}\n" for token, tag in result)+'\n'
+
+FORMATS={
+    'jsonl': format_jsonl,
+    'tsv': format_tsv,
+}
+
+def stream(files:list[str], output:str=None, format:str='jsonl', batch_size:int=512, n_jobs:int=1, pos_log_kwargs:dict=None)->None:
+    formatter=FORMATS[format]
+    out=open(output, 'w', encoding='utf-8') if output else sys.stdout
+    lines=0
+    tokens=0
+    time_start=time.time()
+    try:
+        for result in tag_lines(read_lines(files), batch_size, n_jobs, pos_log_kwargs or {}):
+            out.write(formatter(result))
+            lines+=1
+            tokens+=len(result)
+            if lines%batch_size==0:
+                out.flush()
+        out.flush()
+    except BrokenPipeError:
+        # e.g. piped into head: the rest of the output goes to devnull, so flushing at exit does not raise again (see the signal module's docs)
+        devnull=os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, out.fileno())
+        sys.exit(1)
+    finally:
+        if output:
+            out.close()
+    elapsed_time=time.time()-time_start
+    print(f"Tagged {lines} lines ({tokens} tokens) in {elapsed_time:.2f} s: {lines/elapsed_time if elapsed_time>0 else 0:.0f} lines/s", file=sys.stderr)
+
+######################
+# Server
+######################
+
+def serve(argv:list[str])->None:
+    parser=argparse.ArgumentParser(prog='python -m poslog serve', description="Serve PosLog over HTTP on localhost or a unix socket.")
+    parser.add_argument('--host', default=PosLogServer.DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=PosLogServer.DEFAULT_PORT)
+    parser.add_argument('--unix-socket', help="listen on this unix socket instead of host:port")
+    parser.add_argument('--max-batch', type=int, default=512, help="max. lines per coalesced batch")
+    parser.add_argument('--max-wait-ms', type=float, default=0.0, help="time to wait for more requests to coalesce")
+    parser.add_argument('--cache-size', type=int, help="enable the result cache with this many entries")
+    parser.add_argument('--stats', action='store_true', help="record the latency per stage, served by GET /stats and GET /metrics (Prometheus)")
+    parser.add_argument('--model', help="model path or name (default: bundled model)")
+    parser.add_argument('--domain-words', nargs='+', metavar='FILE', help="additional domain words files (one word per line), reloaded by POST /reload")
+    args=parser.parse_args(argv)
+
+    pos_log_kwargs={}
+    if args.model:
+        pos_log_kwargs['model_path']=args.model
+    if args.domain_words:
+        pos_log_kwargs['domain_words_files']=args.domain_words
+    if args.cache_size:
+        pos_log_kwargs['cache_size']=args.cache_size
+    if args.stats:
+        pos_log_kwargs['stats']=True
+    server=PosLogServer(args.host, args.port, args.unix_socket, args.max_batch, args.max_wait_ms/1000, **pos_log_kwargs)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+######################
+# Lexicon
+######################
+
+def build_lexicon(argv:list[str])->None:
+    from poslog.words import Lexicon
+    parser=argparse.ArgumentParser(prog='python -m poslog build-lexicon', description="Compile the nltk corpora and domain words into a lexicon file for KnownWordsDetector.")
+    parser.add_argument('--output', '-o', help=f"lexicon file (default: {Lexicon.DEFAULT_PATH})")
+    parser.add_argument('--verify', nargs='+', metavar='FILE', help="check the wordnet index against wordnet.synsets() on the tokens of these log files")
+    args=parser.parse_args(argv)
+
+    lexicon=Lexicon.from_nltk()
+    if args.verify:
+        tokenizer=PosLogTokenizer()
+        tokens=[token for line in read_lines(args.verify) for token in tokenizer.tokenize(line)]
+        mismatches=lexicon.verify_wordnet(tokens)
+        if mismatches:
+            print(f"Wordnet index disagrees with wordnet.synsets() on {len(mismatches)} tokens: {mismatches[:20]}", file=sys.stderr)
+            sys.exit(1)
+        print(f"Wordnet index agrees with wordnet.synsets() on {len(set(tokens))} distinct tokens")
+    path=lexicon.save(args.output)
+    print(f"Wrote {path}: "+', '.join(f"{len(lexicon[name])} {name}" for name in Lexicon.SECTIONS))
+
+######################
+# Pruning
+######################
+
+def _load_time(model_path:str, repeat:int=5)->float:
+    best=None
+    pos_log=PosLogCRF(model_path)
+    for _ in range(repeat):
+        time_start=time.perf_counter()
+        pos_log.load_model()
+        elapsed_time=time.perf_counter()-time_start
+        best=elapsed_time if best is None else min(best, elapsed_time)
+    return best
+
+def prune_model(argv:list[str])->None:
+    import os
+    parser=argparse.ArgumentParser(prog='python -m poslog prune-model', description="Write a smaller model without low-weight or rare features and compare it with the original.")
+    parser.add_argument('--output', '-o', required=True, help="pruned model path or name (native .crfsuite)")
+    parser.add_argument('--model', help="model path or name (default: bundled model)")
+    parser.add_argument('--min-weight', type=float, default=0.0, help="drop state and transition features of smaller absolute weight")
+    parser.add_argument('--min-count', type=int, default=0, help="drop state features of attributes occurring less often in the --corpus lines")
+    parser.add_argument('--corpus', nargs='+', metavar='FILE', help="training lines for --min-count")
+    parser.add_argument('--eval', nargs='+', metavar='FILE', help="held-out lines: agreement of the pruned with the original model and predict latency")
+    args=parser.parse_args(argv)
+    if args.min_count>0 and not args.corpus:
+        parser.error("--min-count needs --corpus")
+
+    original=PosLogCRF(args.model)
+    original.load_model()
+    X=None
+    if args.corpus:
+        tokenizer=PosLogTokenizer()
+        X=[tokenizer.tokenize(line) for line in read_lines(args.corpus)]
+    path=original.prune_model(args.output, args.min_weight, args.min_count, X)
+    pruned=PosLogCRF(path)
+    pruned.load_model()
+
+    rows={}
+    for name, pos_log in [('original', original), ('pruned', pruned)]:
+        model=CRFSuiteModel.from_crf(pos_log.crf)
+        rows[name]={
+            'features': len(model),
+            'attributes': len({a for a, _ in model.state_features}),
+            'bytes': os.path.getsize(pos_log.crf.modelfile.name),
+            'load ms': _load_time(pos_log.model_path)*1000,
+        }
+    if args.eval:
+        lines=list(read_lines(args.eval))
+        results={}
+        for name, pos_log in [('original', original), ('pruned', pruned)]:
+            pos_log.predict_strings(lines[:100])
+            time_start=time.perf_counter()
+            results[name]=[pos_log.predict_string(line) for line in lines]
+            rows[name]['predict µs/line']=(time.perf_counter()-time_start)/len(lines)*1e6
+        tags=[(a, b) for line_a, line_b in zip(results['original'], results['pruned']) for a, b in zip(line_a, line_b)]
+        rows['pruned']['agreement']=sum(a==b for a, b in tags)/len(tags)
+    for name, row in rows.items():
+        print(f"{name}: "+', '.join(f"{key} {value}" if isinstance(value, int) else f"{key} {value:.4g}" for key, value in row.items()))
+    print(f"Wrote {path}: {rows['pruned']['bytes']/rows['original']['bytes']:.1%} of the original size")
+
+######################
+# Main
+######################
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python -m poslog 'input log message'")
+    logging.basicConfig(level=logging.INFO)
+    if sys.argv[1:2]==['serve']:
+        serve(sys.argv[2:])
+        return
+    if sys.argv[1:2]==['build-lexicon']:
+        build_lexicon(sys.argv[2:])
+        return
+    if sys.argv[1:2]==['prune-model']:
+        prune_model(sys.argv[2:])
+        return
+
+    parser=argparse.ArgumentParser(prog='python -m poslog', usage=USAGE)
+    parser.add_argument('inputs', nargs='*', help="log message, or input files with --stream (default: stdin)")
+    parser.add_argument('--stream', action='store_true', help="tag files or stdin line by line")
+    parser.add_argument('--format', choices=FORMATS.keys(), default='jsonl', help="output format of --stream")
+    parser.add_argument('--output', '-o', help="output file of --stream (default: stdout)")
+    parser.add_argument('--batch-size', type=int, default=512, help="lines per micro-batch")
+    parser.add_argument('--n-jobs', type=int, default=1, help="worker processes")
+    parser.add_argument('--model', help="model path or name (default: bundled model)")
+    parser.add_argument('--domain-words', nargs='+', metavar='FILE', help="additional domain words files (one word per line)")
+    args=parser.parse_args()
+
+    pos_log_kwargs={'model_path': args.model} if args.model else {}
+    if args.domain_words:
+        pos_log_kwargs['domain_words_files']=args.domain_words
+    if args.stream:
+        stream(args.inputs, args.output, args.format, args.batch_size, args.n_jobs, pos_log_kwargs)
+        return
+
+    if len(args.inputs)!=1:
+        print(f"Usage: {USAGE}")
         sys.exit(1)
 
-    msg = sys.argv[1]
-    pos_log= PosLogCRF()
+    msg = args.inputs[0]
+    pos_log= PosLogCRF(**pos_log_kwargs)
     result = pos_log.predict_string_as_tuple(msg)
     print(result)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,164 @@
+from dataclasses import dataclass, field
+import gc
+import json
+import os
+import time
+
+from poslog.PosLogCRF import PosLogCRF
+
+import logging
+logger = logging.getLogger(__name__)
+
+# hyperparameters of sklearn_crfsuite.CRF besides the defaults of PosLogCRF.CRF_PARAMS
+DEFAULT_PARAM_GRID={
+    'algorithm': ['lbfgs'],
+    'c1': [0.0, 0.05, 0.1, 0.2],
+    'c2': [0.01, 0.05, 0.1, 0.2],
+    'max_iterations': [30, 100],
+}
+# regularization parameters crfsuite accepts per training algorithm (others raise an error)
+ALGORITHM_PARAMS={
+    'lbfgs': {'c1', 'c2'},
+    'l2sgd': {'c2'},
+    'ap': set(),
+    'pa': set(),
+    'arow': set(),
+}
+
+@dataclass
+class TrialResult:
+    params:           dict
+    accuracy:         float
+    accuracy_std:     float
+    # tokens per second, summed over the folds
+    train_throughput:   float
+    predict_throughput: float
+    fold_accuracies:  list[float]=field(default_factory=list)
+
+    def __str__(self)->str:
+        return f"{json.dumps(self.params, default=str)}: accuracy {self.accuracy:.4f} (±{self.accuracy_std:.4f}), train {self.train_throughput:.0f} tokens/s, predict {self.predict_throughput:.0f} tokens/s"
+
+######################
+# Worker
+######################
+
+# Trials (configuration x fold) run on a process pool. The corpus is featurized once, features and tags
+# are inherited by the forked workers instead of being sent with every trial.
+_features:list[list[dict[str,str]]]=None
+_tags:list[list[str]]=None
+
+def _run_trial(trial:tuple[int,int,dict,list[int],list[int]])->tuple[int,int,float,int,float,int,float]:
+    """ Trains on the train sentences of a fold, predicts its test sentences. Returns the keys, accuracy, train tokens and time, test tokens and time. """
+    from sklearn_crfsuite import CRF
+    config, fold, params, train_index, test_index=trial
+    crf=CRF(**params)
+    time_start=time.time()
+    crf.fit([_features[i] for i in train_index], [_tags[i] for i in train_index])
+    train_time=time.time()-time_start
+    X_test=[_features[i] for i in test_index]
+    time_start=time.time()
+    y_pred=crf.predict(X_test)
+    predict_time=time.time()-time_start
+    pairs=[(p, t) for i, pred in zip(test_index, y_pred) for p, t in zip(pred, _tags[i]) if t is not None]
+    accuracy=sum(p==t for p, t in pairs)/len(pairs) if pairs else 0.0
+    train_tokens=sum(len(_tags[i]) for i in train_index)
+    test_tokens=sum(len(x) for x in X_test)
+    return config, fold, accuracy, train_tokens, train_time, test_tokens, predict_time
+
+######################
+# Search
+######################
+
+def crf_params(params:dict)->dict:
+    """ PosLogCRF.CRF_PARAMS updated by params, without the regularization parameters the algorithm does not accept. """
+    merged={**PosLogCRF.CRF_PARAMS, **params}
+    accepted=ALGORITHM_PARAMS.get(merged.get('algorithm'), {'c1', 'c2'})
+    return {key: value for key, value in merged.items() if key not in {'c1', 'c2'}-accepted}
+
+def configurations(param_grid:dict[str,list], n_iter:int=None, seed:int=42)->list[dict]:
+    """ All combinations of the grid, or n_iter random ones (values may be lists or scipy.stats distributions). Duplicates after crf_params are dropped. """
+    from sklearn.model_selection import ParameterGrid, ParameterSampler
+    candidates=ParameterGrid(param_grid) if n_iter is None else ParameterSampler(param_grid, n_iter, random_state=seed)
+    unique={}
+    for params in candidates:
+        params=crf_params(params)
+        unique.setdefault(json.dumps(params, sort_keys=True, default=str), params)
+    return list(unique.values())
+
+def cross_validate(pos_log:PosLogCRF, X:list[list[str]], y:list[list[str]], param_grid:dict[str,list]=None, n_iter:int=None,
+                   n_splits:int=5, n_jobs:int=None, seed:int=42)->list[TrialResult]:
+    """ k-fold cross-validation of each configuration of the grid (default: PosLogCRF.CRF_PARAMS only), or of n_iter random ones (random search).
+    Trials run on n_jobs forked processes (default: all CPUs). Tags None are not scored. Returns the results, best accuracy first. """
+    from sklearn.model_selection import KFold
+    global _features, _tags
+    configs=configurations(param_grid, n_iter, seed) if param_grid is not None else [dict(PosLogCRF.CRF_PARAMS)]
+    folds=list(KFold(n_splits, shuffle=True, random_state=seed).split(X))
+    trials=[(c, f, params, train_index.tolist(), test_index.tolist()) for c, params in enumerate(configs) for f, (train_index, test_index) in enumerate(folds)]
+    n_jobs=min(n_jobs if n_jobs is not None and n_jobs>0 else os.cpu_count() or 1, len(trials))
+    logger.info(f"{len(configs)} configurations x {n_splits} folds on {n_jobs} processes")
+
+    _features=pos_log.make_features_corpus(X, n_jobs)
+    _tags=y
+    try:
+        outcomes=_map_trials(trials, n_jobs)
+    finally:
+        _features=None
+        _tags=None
+
+    results=[]
+    for c, params in enumerate(configs):
+        runs=[outcome for outcome in outcomes if outcome[0]==c]
+        accuracies=[accuracy for _, _, accuracy, *_ in runs]
+        mean=sum(accuracies)/len(accuracies)
+        results.append(TrialResult(
+            params=params,
+            accuracy=mean,
+            accuracy_std=(sum((a-mean)**2 for a in accuracies)/len(accuracies))**0.5,
+            train_throughput=sum(run[3] for run in runs)/sum(run[4] for run in runs),
+            predict_throughput=sum(run[5] for run in runs)/sum(run[6] for run in runs),
+            fold_accuracies=accuracies,
+        ))
+    results.sort(key=lambda result: result.accuracy, reverse=True)
+    return results
+
+def _map_trials(trials:list, n_jobs:int)->list[tuple]:
+    import multiprocessing as mp
+    if n_jobs<=1 or 'fork' not in mp.get_all_start_methods():
+        return [_run_trial(trial) for trial in trials]
+    # keep the inherited features out of the garbage collector to not touch (and copy) their pages
+    gc.freeze()
+    try:
+        with mp.get_context('fork').Pool(n_jobs) as pool:
+            gc.unfreeze()
+            # longest trials (most iterations) first, one trial per task
+            order=sorted(range(len(trials)), key=lambda i: -trials[i][2].get('max_iterations', 0))
+            return pool.map(_run_trial, [trials[i] for i in order], chunksize=1)
+    finally:
+        gc.unfreeze()
+
+def search(pos_log:PosLogCRF, X:list[list[str]], y:list[list[str]], param_grid:dict[str,list]=DEFAULT_PARAM_GRID, n_iter:int=None,
+           n_splits:int=5, n_jobs:int=None, seed:int=42, model:str=None)->list[TrialResult]:
+    """ Cross-validates the grid (or n_iter random configurations), trains pos_log with the best configuration on all sentences
+    and saves it with save_model (to model, default: the model path of pos_log). Returns the results, best accuracy first. """
+    results=cross_validate(pos_log, X, y, param_grid, n_iter, n_splits, n_jobs, seed)
+    for result in results:
+        logger.info(str(result))
+    best=results[0]
+    logger.info(f"Best configuration: {best}")
+    if model is not None:
+        pos_log.model_path=pos_log._get_model_path(model)
+    pos_log.train(X, y, n_jobs, best.params)
+    return results
+
+def report(results:list[TrialResult])->str:
+    """ Results as a table, best accuracy first. """
+    # the parameters that differ between the configurations
+    keys=sorted({key for result in results for key in result.params})
+    keys=[key for key in keys if len({str(result.params.get(key)) for result in results})>1] or keys
+    header=keys+['accuracy', 'std', 'train tokens/s', 'predict tokens/s']
+    rows=[[_format(result.params.get(key, '')) for key in keys]+[f"{result.accuracy:.4f}", f"{result.accuracy_std:.4f}", f"{result.train_throughput:.0f}", f"{result.predict_throughput:.0f}"] for result in results]
+    widths=[max(len(row[i]) for row in [header]+rows) for i in range(len(header))]
+    return '\n'.join('  '.join(cell.rjust(width) for cell, width in zip(row, widths)) for row in [header]+rows)
+
+def _format(value)->str:
+    return f"{value:.4g}" if isinstance(value, float) else str(value)
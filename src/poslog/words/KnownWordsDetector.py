@@ -1,10 +1,11 @@
+from collections.abc import Callable, Iterable
 from enum import Enum
-from nltk.corpus import stopwords
-from nltk.corpus import wordnet
-from nltk.corpus import words
-import nltk
-
 from pathlib import Path
+import hashlib
+import threading
+import weakref
+
+from poslog.words.Lexicon import Lexicon, read_domain_words
 
 import logging
 logger = logging.getLogger(__name__)
@@ -18,24 +19,45 @@ class WordKind(Enum):
     UNKNOWN = 'unknown'
 
 class KnownWordsDetector:
+    DEFAULT_DOMAIN_SOURCE = 'default'
 
-    def __init__(self, case_sensitive: bool = False):
-        corpora_deps = ['words', 'stopwords', 'wordnet']
-        for dependency in corpora_deps:
-            try:
-                nltk.data.find(f'corpora/{dependency}')
-            except LookupError:
-                logger.info(f"Initializing {self.__class__.__name__}")
-                logger.info(f"Did not find corpus '{dependency}'. Downloading...")
-                nltk.download(dependency)
-
+    def __init__(self, case_sensitive: bool = False, lexicon_path: str | Path = None):
+        """ lexicon_path: prebuilt Lexicon file (default: the one shipped with poslog), if missing the word lists are read from the nltk corpora
+        and cached in Lexicon.CACHE_PATH. """
         self.case_sensitive = case_sensitive
-        # dict lookup is faster than list lookup
-        self.words_dictionary: dict[str, None] = dict.fromkeys(
-            [w.lower() for w in words.words()], None)
-        self.stopwords_dict: dict[str, None] = dict.fromkeys(
-            stopwords.words('english'), None)
-        self.domain_words: dict[str, None] = self._read_domain_words()
+        lexicon = self._load_lexicon(lexicon_path)
+        # set lookup like the former dict lookup, both are faster than list lookup
+        self.words_dictionary: frozenset[str] = lexicon.words_dictionary
+        self.stopwords_dict: frozenset[str] = lexicon.stopwords
+        # domain words per source (the packaged ones as DEFAULT_DOMAIN_SOURCE, e.g. 'HDFS' from a user file),
+        # looked up in their union which is replaced as a whole on changes, so readers never see a partial update
+        self._domain_lock = threading.Lock()
+        self._domain_listeners: list[Callable[[], Callable]] = []
+        self.domain_word_files: dict[str, list[Path]] = {}
+        self.domain_word_sources: dict[str, frozenset[str]] = {self.DEFAULT_DOMAIN_SOURCE: self._read_domain_words(lexicon.domain_words)}
+        self.domain_words: frozenset[str] = frozenset().union(*self.domain_word_sources.values())
+        # forms wordnet.synsets() resolves (incl. morphological variants), a set lookup instead of morphy and synset loading per token
+        self.wordnet_forms: frozenset[str] = lexicon.wordnet
+        self._lexicon_fingerprint: str = lexicon.digest
+
+    def _load_lexicon(self, lexicon_path: str | Path = None) -> Lexicon:
+        if lexicon_path is not None:
+            return Lexicon.load(lexicon_path)
+        for path in (Lexicon.DEFAULT_PATH, Lexicon.CACHE_PATH):
+            if path.exists():
+                try:
+                    return Lexicon.load(path)
+                except ValueError as e:
+                    logger.warning(f"{e} Falling back to the nltk corpora.")
+        logger.warning(f"No lexicon at '{Lexicon.DEFAULT_PATH}', reading the nltk corpora (takes seconds). Build it with 'python -m poslog build-lexicon'.")
+        lexicon = Lexicon.from_nltk()
+        # built once, later detectors (e.g. in worker processes) load it
+        try:
+            Lexicon.CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            lexicon.save(Lexicon.CACHE_PATH)
+        except OSError as e:
+            logger.warning(f"Could not cache the lexicon at '{Lexicon.CACHE_PATH}': {e}")
+        return lexicon
 
     ######################
     # Known Words
@@ -52,7 +74,7 @@ class KnownWordsDetector:
             return WordKind.DOMAIN_WORD
         if self._is_number(token):
             return WordKind.NUMBER
-        if wordnet.synsets(token):
+        if token.lower() in self.wordnet_forms:
             return WordKind.WORD_NET
         if token.lower() in self.words_dictionary:
             return WordKind.WORDS_DICTIONARY
@@ -77,21 +99,80 @@ class KnownWordsDetector:
     # Domain Words
     ######################
 
-    def _read_domain_words(self):
-        DOMAIN_WORDS_FILENAME = "known_domain_words.txt"
-        domain_words_file = Path(__file__).parent / DOMAIN_WORDS_FILENAME
-        if not domain_words_file.exists():
-            raise FileNotFoundError(
-                f"Domain words file {domain_words_file} does not exist.")
-        # load line wise from file
-        with domain_words_file.open('r') as file:
-            if self.case_sensitive:
-                return [line.strip() for line in file.readlines()]
-            else:
-                return [line.strip().lower() for line in file.readlines()]
+    def _read_domain_words(self, domain_words: Iterable[str] = None) -> frozenset[str]:
+        if domain_words is None:
+            domain_words = read_domain_words()
+        if self.case_sensitive:
+            return frozenset(domain_words)
+        return frozenset(word.lower() for word in domain_words)
 
     def is_domain_word(self, word: str) -> bool:
         if not self.case_sensitive:
             word = word.lower()
         return word in self.domain_words
-    
+
+    def set_domain_words(self, source: str, words: Iterable[str]) -> None:
+        """ Replaces the domain words of a source (e.g. 'HDFS'). """
+        self._update_domain_sources({source: self._read_domain_words(words)})
+
+    def load_domain_words(self, files: str | Path | list[str | Path], source: str = None) -> None:
+        """ Replaces the domain words of a source by the words (one per line) of the files, source defaults to the name of the (first) file.
+        The files are read again by reload_domain_words(). """
+        files = [Path(file) for file in (files if isinstance(files, list) else [files])]
+        source = source if source is not None else files[0].stem
+        words = self._read_domain_word_files(files)
+        with self._domain_lock:
+            self.domain_word_files[source] = files
+        self._update_domain_sources({source: words})
+
+    def remove_domain_words(self, source: str) -> None:
+        with self._domain_lock:
+            self.domain_word_files.pop(source, None)
+        self._update_domain_sources({source: None})
+
+    def reload_domain_words(self) -> None:
+        """ Reads the files of all sources again and swaps in the new words at once (nothing changes if a file can not be read). """
+        with self._domain_lock:
+            domain_word_files = dict(self.domain_word_files)
+        self._update_domain_sources({source: self._read_domain_word_files(files) for source, files in domain_word_files.items()})
+
+    def fingerprint(self) -> str:
+        """ Hash of the known words (lexicon and current domain words), changes whenever kind_of_known_word may (besides the source). """
+        if self._lexicon_fingerprint is None:
+            # lexicon without digest, it does not change after loading, hash it once
+            self._lexicon_fingerprint = _hash_words(self.stopwords_dict, self.words_dictionary, self.wordnet_forms)
+        return _hash_words(frozenset([self._lexicon_fingerprint, str(self.case_sensitive)]), self.domain_words)
+
+    def add_domain_listener(self, callback: Callable[[], None]) -> None:
+        """ Calls callback() after the domain words changed, e.g. to drop cached features. Bound methods are referenced weakly. """
+        ref = weakref.WeakMethod(callback) if hasattr(callback, '__self__') else lambda: callback
+        with self._domain_lock:
+            self._domain_listeners.append(ref)
+
+    def _read_domain_word_files(self, files: list[Path]) -> frozenset[str]:
+        return self._read_domain_words(word for file in files for word in read_domain_words(file) if word)
+
+    def _update_domain_sources(self, updates: dict[str, frozenset[str] | None]) -> None:
+        """ Sets (or removes for None) the words of sources and replaces the union. """
+        with self._domain_lock:
+            sources = dict(self.domain_word_sources)
+            for source, words in updates.items():
+                if words is None:
+                    sources.pop(source, None)
+                else:
+                    sources[source] = words
+            self.domain_word_sources = sources
+            self.domain_words = frozenset().union(*sources.values())
+            self._domain_listeners = [ref for ref in self._domain_listeners if ref() is not None]
+            listeners = [ref() for ref in self._domain_listeners]
+        logger.info(f"Domain words: {len(self.domain_words)} from {', '.join(f'{source} ({len(words)})' for source, words in sources.items())}")
+        for listener in listeners:
+            if listener is not None:
+                listener()
+
+def _hash_words(*word_sets: frozenset[str]) -> str:
+    h = hashlib.sha256()
+    for words in word_sets:
+        h.update('\n'.join(sorted(words)).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
@@ -0,0 +1,169 @@
+from pathlib import Path
+import hashlib
+import json
+import os
+import struct
+
+import logging
+logger = logging.getLogger(__name__)
+
+DOMAIN_WORDS_FILE = Path(__file__).parent / "known_domain_words.txt"
+NLTK_CORPORA = ['words', 'stopwords', 'wordnet']
+
+def ensure_nltk_corpora(corpora: list[str] = NLTK_CORPORA) -> None:
+    """ Downloads missing nltk corpora. """
+    import nltk
+    for dependency in corpora:
+        try:
+            nltk.data.find(f'corpora/{dependency}')
+        except LookupError:
+            logger.info(f"Did not find corpus '{dependency}'. Downloading...")
+            nltk.download(dependency)
+
+def read_domain_words(file: Path = DOMAIN_WORDS_FILE) -> list[str]:
+    """ One word per line. """
+    if not file.exists():
+        raise FileNotFoundError(f"Domain words file {file} does not exist.")
+    with file.open('r') as f:
+        return [line.strip() for line in f.readlines()]
+
+def wordnet_forms() -> frozenset[str]:
+    """ Lower case surface forms for which wordnet.synsets() finds synsets (for any part of speech).
+    Replicates nltk's morphy: a form resolves if it is a lemma, or, if it is in the exception list, one of its exceptions is a lemma,
+    otherwise if one substitution rule (e.g. 'ies'->'y') turns it into a lemma. So the forms are the lemmas, the resolving exceptions
+    and the lemmas with each applicable rule inverted. """
+    ensure_nltk_corpora(['wordnet'])
+    import nltk
+    from nltk.corpus import wordnet
+    from nltk.corpus.reader.wordnet import POS_LIST
+    # older nltk versions apply the rules repeatedly until a lemma is found ('dogss'->'dogs'->'dog'), which can not be enumerated
+    if wordnet._morphy('dogss', wordnet.NOUN):
+        raise RuntimeError(f"morphy of nltk {nltk.__version__} applies its rules repeatedly, the wordnet index requires single step morphy.")
+    forms = set()
+    for pos in POS_LIST:
+        lemmas = {lemma for lemma, offsets in wordnet._lemma_pos_offset_map.items() if pos in offsets}
+        exceptions = wordnet._exception_map[pos]
+        forms.update(lemmas)
+        forms.update(form for form, bases in exceptions.items() if any(base in lemmas for base in bases))
+        for old, new in wordnet.MORPHOLOGICAL_SUBSTITUTIONS[pos]:
+            for lemma in lemmas:
+                if lemma.endswith(new):
+                    form = lemma[:len(lemma) - len(new)] + old
+                    # morphy does not apply rules to forms of the exception list
+                    if form not in exceptions:
+                        forms.add(form)
+    return frozenset(forms)
+
+class Lexicon:
+    """ Word lists of KnownWordsDetector compiled into one versioned binary file.
+    Layout: magic, format version and length of a json header (little endian uint32), the json header
+    (metadata, offset and length of each section) and the sections, each a sorted, newline separated utf-8 word list.
+    Loading takes a fraction of a second and needs no nltk. """
+
+    MAGIC = b'POSLOGLX'
+    FORMAT_VERSION = 2
+    DEFAULT_PATH = Path(__file__).parent / "known_words.lexicon"
+    # lexicon built from the nltk corpora if the shipped one is missing, reused by later processes
+    CACHE_PATH = Path(os.environ.get('POSLOG_CACHE_DIR', Path.home() / '.cache' / 'poslog')) / "known_words.lexicon"
+    SECTIONS = ['stopwords', 'domain_words', 'words_dictionary', 'wordnet']
+
+    def __init__(self, sections: dict[str, frozenset[str]], metadata: dict = None):
+        self.sections = sections
+        self.metadata = metadata or {}
+        # identifies the word lists cheaply: sha256 of the file the lexicon was loaded from, or of the corpus versions if built from nltk
+        self.digest: str = None
+
+    def __getitem__(self, section: str) -> frozenset[str]:
+        return self.sections[section]
+
+    @property
+    def stopwords(self) -> frozenset[str]:
+        return self.sections['stopwords']
+
+    @property
+    def domain_words(self) -> frozenset[str]:
+        """ As in the domain words file, i.e. case sensitive. """
+        return self.sections['domain_words']
+
+    @property
+    def words_dictionary(self) -> frozenset[str]:
+        """ Lower case. """
+        return self.sections['words_dictionary']
+
+    @property
+    def wordnet(self) -> frozenset[str]:
+        """ Lower case surface forms for which wordnet.synsets() finds synsets. """
+        return self.sections['wordnet']
+
+    ######################
+    # Build
+    ######################
+
+    @classmethod
+    def from_nltk(cls) -> 'Lexicon':
+        """ Builds the lexicon from the nltk corpora (downloaded if missing) and the domain words file. """
+        ensure_nltk_corpora()
+        import nltk
+        from nltk.corpus import stopwords, words, wordnet
+        sections = {
+            'stopwords': frozenset(stopwords.words('english')),
+            'domain_words': frozenset(read_domain_words()),
+            'words_dictionary': frozenset(w.lower() for w in words.words()),
+            'wordnet': wordnet_forms(),
+        }
+        lexicon = cls(sections, {'nltk_version': nltk.__version__, 'wordnet_version': wordnet.get_version()})
+        # the corpora are determined by their versions, the domain words file is hashed
+        identity = {'metadata': lexicon.metadata, 'counts': {name: len(words) for name, words in sections.items()}, 'domain_words': sorted(sections['domain_words'])}
+        lexicon.digest = hashlib.sha256(json.dumps(identity).encode('utf-8')).hexdigest()
+        return lexicon
+
+    def verify_wordnet(self, tokens: list[str]) -> list[str]:
+        """ Returns the tokens on which the wordnet section disagrees with wordnet.synsets(). """
+        from nltk.corpus import wordnet
+        return [token for token in dict.fromkeys(tokens) if (token.lower() in self.wordnet) != bool(wordnet.synsets(token))]
+
+    ######################
+    # Save & Load
+    ######################
+
+    def save(self, path: str | Path = None) -> Path:
+        path = Path(path) if path is not None else self.DEFAULT_PATH
+        blobs = {name: '\n'.join(sorted(self.sections[name])).encode('utf-8') for name in self.SECTIONS}
+        offset = 0
+        index = {}
+        for name, blob in blobs.items():
+            index[name] = {'offset': offset, 'length': len(blob), 'count': len(self.sections[name])}
+            offset += len(blob)
+        header = json.dumps({'metadata': self.metadata, 'sections': index}).encode('utf-8')
+        # write next to the target and rename, readers never see a partial file
+        tmp_path = path.with_name(path.name + '.tmp')
+        with tmp_path.open('wb') as f:
+            f.write(self.MAGIC)
+            f.write(struct.pack('<II', self.FORMAT_VERSION, len(header)))
+            f.write(header)
+            for blob in blobs.values():
+                f.write(blob)
+        tmp_path.replace(path)
+        logger.info(f"Saved lexicon to '{path}'")
+        return path
+
+    @classmethod
+    def load(cls, path: str | Path = None) -> 'Lexicon':
+        path = Path(path) if path is not None else cls.DEFAULT_PATH
+        data = path.read_bytes()
+        if not data.startswith(cls.MAGIC):
+            raise ValueError(f"{path} is no lexicon file.")
+        start = len(cls.MAGIC)
+        version, header_length = struct.unpack_from('<II', data, start)
+        if version != cls.FORMAT_VERSION:
+            raise ValueError(f"Lexicon {path} has format version {version}, expected {cls.FORMAT_VERSION}. Rebuild it with 'python -m poslog build-lexicon'.")
+        start += struct.calcsize('<II')
+        header = json.loads(data[start:start + header_length])
+        start += header_length
+        sections = {}
+        for name, entry in header['sections'].items():
+            blob = data[start + entry['offset']:start + entry['offset'] + entry['length']]
+            sections[name] = frozenset(blob.decode('utf-8').split('\n')) if entry['count'] else frozenset()
+        lexicon = cls(sections, header['metadata'])
+        lexicon.digest = hashlib.sha256(data).hexdigest()
+        return lexicon
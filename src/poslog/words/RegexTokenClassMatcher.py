@@ -1,6 +1,23 @@
+from bisect import bisect_right
+from collections.abc import Iterator
 from enum import Enum
 from re import Pattern
 import re
+import string
+import sys
+
+import logging
+logger = logging.getLogger(__name__)
+
+# the prefilter analyses the parsed patterns with the regex parser of CPython 3.11+ (internal modules, formerly sre_parse and sre_constants),
+# without it the matcher falls back to the combined alternation
+try:
+    from re import _parser
+    from re._constants import (LITERAL, NOT_LITERAL, ANY, IN, RANGE, CATEGORY, NEGATE, AT, BRANCH, SUBPATTERN, ATOMIC_GROUP,
+        MAX_REPEAT, MIN_REPEAT, POSSESSIVE_REPEAT, CATEGORY_DIGIT, CATEGORY_NOT_DIGIT, CATEGORY_SPACE, CATEGORY_NOT_SPACE,
+        CATEGORY_WORD, CATEGORY_NOT_WORD)
+except ImportError:
+    _parser = None
 
 class TokenClass(Enum):
     NUMBER = 'Number'
@@ -16,22 +33,185 @@ class TokenClass(Enum):
     UNKNOWN = 'Unknown'
 
 
+######################
+# Prefilter Signature
+######################
+
+# character features of a token's signature (bit i: token contains a character of SIGNATURE_FEATURES[i])
+SIGNATURE_FEATURES: list[str] = [
+    '=', ':', '/', '\\', '.', '-', '_', ',',
+    string.digits,
+    string.ascii_uppercase,
+    string.ascii_lowercase,
+    ''.join(c for c in string.punctuation if c not in '=:/\\.-_,'),
+    string.whitespace,
+]
+
+if _parser is not None:
+    _REPEATS = (MAX_REPEAT, MIN_REPEAT, POSSESSIVE_REPEAT)
+    _CATEGORY_PATTERNS = {
+        CATEGORY_DIGIT: re.compile(r'\d'), CATEGORY_NOT_DIGIT: re.compile(r'\D'),
+        CATEGORY_SPACE: re.compile(r'\s'), CATEGORY_NOT_SPACE: re.compile(r'\S'),
+        CATEGORY_WORD: re.compile(r'\w'), CATEGORY_NOT_WORD: re.compile(r'\W'),
+    }
+
+def _char_nodes(subpattern) -> Iterator[tuple]:
+    """ Yields the single character nodes of a parsed pattern, (None, None) for anything not analysed. """
+    for op, av in subpattern:
+        if op in (LITERAL, NOT_LITERAL, ANY, IN):
+            yield op, av
+        elif op in _REPEATS:
+            if av[1] > 0:
+                yield from _char_nodes(av[2])
+        elif op is SUBPATTERN and not av[1] & re.IGNORECASE:
+            yield from _char_nodes(av[3])
+        elif op is ATOMIC_GROUP:
+            yield from _char_nodes(av)
+        elif op is BRANCH:
+            for alternative in av[1]:
+                yield from _char_nodes(alternative)
+        elif op is not AT:
+            yield None, None
+
+def _char_matches(op, av, c: str) -> bool:
+    """ Whether a single character node can match c (True if unknown). """
+    if op is LITERAL:
+        return ord(c) == av
+    if op is NOT_LITERAL:
+        return ord(c) != av
+    if op is ANY:
+        return c != '\n'
+    if op is IN:
+        negate = False
+        hit = False
+        for item_op, item_av in av:
+            if item_op is NEGATE:
+                negate = True
+            elif item_op is LITERAL:
+                hit |= ord(c) == item_av
+            elif item_op is RANGE:
+                hit |= item_av[0] <= ord(c) <= item_av[1]
+            elif item_op is CATEGORY and item_av in _CATEGORY_PATTERNS:
+                hit |= _CATEGORY_PATTERNS[item_av].fullmatch(c) is not None
+            else:
+                return True
+        return hit != negate
+    return True
+
+def _in_subset(items, chars: str) -> bool:
+    """ Whether a character set [...] only contains characters of chars. """
+    for op, av in items:
+        if op is LITERAL:
+            if chr(av) not in chars:
+                return False
+        elif op is RANGE:
+            low, high = av
+            if high - low + 1 > len(chars) or any(chr(o) not in chars for o in range(low, high + 1)):
+                return False
+        else:
+            return False
+    return bool(items)
+
+def _must_contain(subpattern, chars: str) -> bool:
+    """ Whether every match of a parsed pattern contains a character of chars. """
+    for op, av in subpattern:
+        if op is LITERAL and chr(av) in chars:
+            return True
+        if op is IN and _in_subset(av, chars):
+            return True
+        if op in _REPEATS and av[0] >= 1 and _must_contain(av[2], chars):
+            return True
+        if op is SUBPATTERN and not av[1] & re.IGNORECASE and _must_contain(av[3], chars):
+            return True
+        if op is ATOMIC_GROUP and _must_contain(av, chars):
+            return True
+        if op is BRANCH and all(_must_contain(alternative, chars) for alternative in av[1]):
+            return True
+    return False
+
+
 class _RegexPatternEntry():
     def __init__(self, pattern: str, token_class: TokenClass, description: str):
         self.pattern: Pattern = re.compile(pattern)
         self.token_class: TokenClass = token_class
         self.description: str = description
+        # prefilter requirements (see analyse): signature bits every match has (required) or no match has (forbidden)
+        self.min_length: int = 0
+        self.max_length: int = sys.maxsize
+        self.required: int = 0
+        self.forbidden: int = 0
+
+    def analyse(self) -> None:
+        """ Derives the prefilter requirements from the parsed pattern. Raises if the regex parser is not available. """
+        if _parser is None:
+            raise ImportError("re._parser is not available")
+        parsed = _parser.parse(self.pattern.pattern, self.pattern.flags)
+        self.min_length, self.max_length = parsed.getwidth()
+        if not self.pattern.flags & re.IGNORECASE:
+            nodes = list(_char_nodes(parsed))
+            for bit, chars in enumerate(SIGNATURE_FEATURES):
+                if _must_contain(parsed, chars):
+                    self.required |= 1 << bit
+                if not any(_char_matches(op, av, c) for op, av in nodes for c in chars):
+                    self.forbidden |= 1 << bit
+
+    def can_match(self, signature_bits: int, length: int) -> bool:
+        return (self.required & ~signature_bits) == 0 and (self.forbidden & signature_bits) == 0 and self.min_length <= length <= self.max_length
+
+class _Candidates():
+    """ Patterns which can match tokens of one signature, in priority order. """
+    def __init__(self, indices: tuple[int, ...]):
+        self.indices: tuple[int, ...] = indices
+        # combined alternation of the candidates, compiled on first use
+        self.pattern: Pattern = None
+        self.group_positions: dict[int, int] = None
 
 class RegexTokenClassMatcher:
 
-    def __init__(self):
+    def __init__(self, combined: bool = True, prefilter: bool = True, collect_stats: bool = False):
+        """ combined: match all patterns in one scan with a single alternation, otherwise try them one after another.
+        prefilter: only try the patterns which can match the token's character signature (needs CPython's re._parser, 3.11+, otherwise it is disabled).
+        collect_stats: count the regex evaluations of the prefiltered tokens (see stats()), approximate if the matcher is shared by threads. """
         self.regex_list: list[_RegexPatternEntry] = self._fill_regex_list()
+        self.combined = combined
+        self.prefilter = prefilter
+        self.collect_stats = collect_stats
+        if prefilter:
+            try:
+                for rmp in self.regex_list:
+                    rmp.analyse()
+            except Exception as e:
+                logger.warning(f"Regex prefilter is not available ({e!r}), matching without it.")
+                self.prefilter = False
+        self.combined_pattern, self.group_positions = self._compile_combined_pattern(self.regex_list)
+
+        self._char_bits: dict[str, int] = {}
+        for bit, chars in enumerate(SIGNATURE_FEATURES):
+            for c in chars:
+                self._char_bits[c] = self._char_bits.get(c, 0) | 1 << bit
+        # maps characters to one representative per bits, so a token has less distinct characters to look up
+        representatives: dict[int, str] = {}
+        for c, bits in self._char_bits.items():
+            representatives.setdefault(bits, c)
+        self._signature_table = str.maketrans({c: representatives[bits] for c, bits in self._char_bits.items()})
+        # lengths between two boundaries can be matched by the same patterns
+        self._length_boundaries: list[int] = sorted({0} | {rmp.min_length for rmp in self.regex_list} | {rmp.max_length + 1 for rmp in self.regex_list})
+        self._candidates: dict[tuple[int, int], _Candidates] = {}
+        self._combined_candidates: dict[tuple[int, ...], _Candidates] = {}
+        self.reset_stats()
  
  
     def token_classes(self, tokens: list[str]) -> list[TokenClass]:
         return [self.token_class(token) for token in tokens]
 
     def token_class(self, token: str) -> TokenClass:
+        if self.prefilter:
+            return self.token_class_prefiltered(token)
+        if self.combined:
+            return self.token_class_combined(token)
+        return self.token_class_sequential(token)
+
+    def token_class_sequential(self, token: str) -> TokenClass:
         token_class=TokenClass.UNKNOWN
         for rmp in self.regex_list:
             if rmp.pattern.fullmatch(token):
@@ -39,6 +219,96 @@ class RegexTokenClassMatcher:
                 break
         return token_class
 
+    def token_class_combined(self, token: str) -> TokenClass:
+        match = self.combined_pattern.fullmatch(token)
+        if match is None:
+            return TokenClass.UNKNOWN
+        # the group of the matching alternative closes last
+        return self.regex_list[self.group_positions[match.lastindex]].token_class
+
+    def token_class_prefiltered(self, token: str) -> TokenClass:
+        candidates = self.candidates(token)
+        position = None
+        if self.combined:
+            if candidates.pattern is None:
+                self._compile_candidates(candidates)
+            match = candidates.pattern.fullmatch(token) if candidates.indices else None
+            if match is not None:
+                position = candidates.group_positions[match.lastindex]
+        else:
+            for i, index in enumerate(candidates.indices):
+                if self.regex_list[index].pattern.fullmatch(token):
+                    position = i
+                    break
+
+        if self.collect_stats:
+            self._count_evaluations(candidates, position)
+        if position is None:
+            return TokenClass.UNKNOWN
+        return self.regex_list[candidates.indices[position]].token_class
+
+    def _count_evaluations(self, candidates: _Candidates, position: int | None) -> None:
+        """ Regex evaluations of the sequential loop without and with prefilter (unlocked counters). """
+        self.tokens += 1
+        if position is None:
+            self.evaluations += len(candidates.indices)
+            self.skipped_evaluations += len(self.regex_list) - len(candidates.indices)
+            return
+        index = candidates.indices[position]
+        self.evaluations += position + 1
+        self.skipped_evaluations += index - position
+
+    ######################
+    # Prefilter
+    ######################
+
+    def signature(self, token: str) -> tuple[int, int]:
+        """ Character features (bits of SIGNATURE_FEATURES) and length bucket of a token. """
+        bits = 0
+        char_bits = self._char_bits
+        for c in set(token.translate(self._signature_table)):
+            bits |= char_bits.get(c, 0)
+        return bits, bisect_right(self._length_boundaries, len(token))
+
+    def candidates(self, token: str) -> _Candidates:
+        key = self.signature(token)
+        candidates = self._candidates.get(key)
+        if candidates is None:
+            bits, bucket = key
+            length = self._length_boundaries[bucket - 1]
+            indices = tuple(i for i, rmp in enumerate(self.regex_list) if rmp.can_match(bits, length))
+            # signatures with the same candidates share the compiled alternation
+            candidates = self._combined_candidates.setdefault(indices, _Candidates(indices))
+            self._candidates[key] = candidates
+        return candidates
+
+    def _compile_candidates(self, candidates: _Candidates) -> None:
+        candidates.pattern, candidates.group_positions = self._compile_combined_pattern([self.regex_list[i] for i in candidates.indices])
+
+    def stats(self) -> dict[str, float]:
+        """ Regex evaluations of the prefiltered tokens (as in the sequential loop) and how many were skipped by the prefilter, counted with collect_stats. """
+        total = self.evaluations + self.skipped_evaluations
+        return {
+            'tokens': self.tokens,
+            'evaluations': self.evaluations,
+            'skipped_evaluations': self.skipped_evaluations,
+            'skip_rate': self.skipped_evaluations / total if total else 0.0,
+            'signatures': len(self._candidates),
+            'candidate_sets': len(self._combined_candidates),
+        }
+
+    def reset_stats(self) -> None:
+        self.tokens = 0
+        self.evaluations = 0
+        self.skipped_evaluations = 0
+
+    @staticmethod
+    def _compile_combined_pattern(regex_list: list[_RegexPatternEntry]) -> tuple[Pattern, dict[int, int]]:
+        """ Joins the patterns into one alternation of named groups '(?P<p0>...)|(?P<p1>...)|...', returns it with the position in regex_list of each group.
+        The alternatives are tried in order and the first one matching the whole token wins, like the sequential loop. """
+        combined_pattern = re.compile('|'.join(f'(?P<p{i}>{rmp.pattern.pattern})' for i, rmp in enumerate(regex_list)))
+        group_positions = {combined_pattern.groupindex[f'p{i}']: i for i in range(len(regex_list))}
+        return combined_pattern, group_positions
 
     ######################
     # Regex List
@@ -1,2 +1,3 @@
 from .KnownWordsDetector import *
-from .RegexTokenClassMatcher import *
\ No newline at end of file
+from .RegexTokenClassMatcher import *
+from .Lexicon import *
\ No newline at end of file
@@ -31,9 +31,9 @@ setup(
     packages=['poslog', 'poslog.words'],
     include_package_data=True,
     package_data={
-        'poslog': ['models/pos_log_upos_crf_10k_model.pkl', 'words/*.txt'],
+        'poslog': ['models/pos_log_upos_crf_10k_model.pkl', 'models/pos_log_upos_crf_10k_model.crfsuite', 'words/*.txt', 'words/*.lexicon'],
     },
-    install_requires=['nltk', 'sklearn-crfsuite'],
+    install_requires=['nltk', 'sklearn-crfsuite', 'numpy', 'scipy', 'scikit-learn'],
     cmdclass={
         'install': PostInstallCommand,
     },
@@ -0,0 +1,3 @@
+from .examples import *
+from .bench_poslog import *
+from .bench_startup import *
@@ -0,0 +1,20 @@
+from util.benchmark import load_examples, load_manual_tagging, load_corpus_lines, bench_predict_batch, bench_make_features, bench_attribute_encoder, bench_numpy_crf, bench_startup, bench_lexicon, bench_wordnet, bench_token_class, bench_tokenizer, bench_incremental_training, bench_training_features, bench_pruning
+
+def main():
+    bench_startup()
+    bench_lexicon()
+    examples=load_examples()
+    lines=[line for _, line in examples]
+    bench_predict_batch(lines)
+    bench_tokenizer(lines)
+    bench_make_features(lines)
+    bench_attribute_encoder(lines)
+    bench_numpy_crf(lines)
+    bench_training_features(lines)
+    bench_wordnet(lines)
+    bench_token_class(load_corpus_lines())
+    bench_incremental_training(examples)
+    bench_pruning(examples, load_manual_tagging())
+
+if __name__ == "__main__":
+    main()
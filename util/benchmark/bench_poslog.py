@@ -0,0 +1,369 @@
+from poslog import PosLogCRF, PosLogTokenizer, FeatureExtractor, ParallelPosLogTagger
+import os
+import shutil
+import time
+
+def _report(name:str, elapsed_time:float, lines:int, tokens:int)->None:
+    print(f"{name}")
+    print(f"Elapsed time: {elapsed_time}")
+    print(f"Time per 1000 lines: {elapsed_time/lines*1000}")
+    print(f"Time per 1,000,000 tokens: {elapsed_time/tokens*1000000}\n")
+
+def bench_predict_batch(lines:list[str], pos_log:PosLogCRF=None)->float:
+    """ Compares the per-line loop of notebook 5 (tag_and_meas_time) with predict_batch. Returns the speedup. """
+    if pos_log is None:
+        pos_log=PosLogCRF()
+    pos_log.load_model()
+    tokenizer=PosLogTokenizer()
+    X=[tokenizer.tokenize(line) for line in lines]
+    tokens=sum([len(x) for x in X])
+    # warm up lazy corpus loading (e.g. wordnet)
+    pos_log.predict_batch(X)
+
+    time_start=time.time()
+    y_loop=[pos_log.predict(x) for x in X]
+    loop_time=time.time()-time_start
+    _report('predict (per line)', loop_time, len(X), tokens)
+
+    time_start=time.time()
+    y_batch=pos_log.predict_batch(X)
+    batch_time=time.time()-time_start
+    _report('predict_batch', batch_time, len(X), tokens)
+
+    if y_loop!=y_batch:
+        raise AssertionError("predict_batch differs from predict")
+    print(f"Speedup: {loop_time/batch_time:.2f}x")
+    return loop_time/batch_time
+
+def _best_time(fn, repeat:int)->float:
+    best=None
+    for _ in range(repeat):
+        time_start=time.time()
+        fn()
+        elapsed_time=time.time()-time_start
+        best=elapsed_time if best is None else min(best, elapsed_time)
+    return best
+
+def bench_make_features(lines:list[str], repeat:int=3)->dict[str,float]:
+    """ Per-token cost of FeatureExtractor without and with the static feature cache (best of `repeat` runs). Returns microseconds per token. """
+    tokenizer=PosLogTokenizer()
+    X=[tokenizer.tokenize(line) for line in lines]
+    tokens=sum([len(x) for x in X])
+    uncached=FeatureExtractor(cache_size=0)
+    cached=FeatureExtractor(uncached.kwdet, uncached.rgtcm)
+    # warm up lazy corpus loading and the cache
+    for x in X:
+        uncached.make_features(x)
+        cached.make_features(x)
+
+    result={}
+    for name, extractor in [('uncached', uncached), ('cached', cached)]:
+        elapsed_time=_best_time(lambda: [extractor.make_features(x) for x in X], repeat)
+        _report(f'make_features ({name})', elapsed_time, len(X), tokens)
+        result[name]=elapsed_time/tokens*1000000
+        print(f"Microseconds per token: {result[name]:.2f}\n")
+    return result
+
+def bench_attribute_encoder(lines:list[str], repeat:int=3)->dict[str,float]:
+    """ Tagging via feature dicts (sklearn_crfsuite.CRF.predict) and via the attributes of AttributeEncoder, both with warm caches (best of `repeat` runs).
+    Raises if the tags differ. Returns microseconds per token. """
+    pos_log=PosLogCRF()
+    pos_log.load_model()
+    tokenizer=PosLogTokenizer()
+    X=[tokenizer.tokenize(line) for line in lines]
+    tokens=sum([len(x) for x in X])
+    encoder=pos_log._get_attribute_encoder()
+    tagger=pos_log.crf.tagger_
+    tag_features=lambda: [list(y) for y in pos_log.crf.predict(pos_log.make_features_batch(X))]
+    tag_attributes=lambda: [tagger.tag(attributes) for attributes in encoder.encode_batch(X)]
+    if tag_features()!=tag_attributes():
+        raise AssertionError("tags of the attributes differ from the tags of the feature dicts")
+
+    result={}
+    for name, fn in [('feature dicts', tag_features), ('attributes', tag_attributes)]:
+        elapsed_time=_best_time(fn, repeat)
+        _report(f'tag {name}', elapsed_time, len(X), tokens)
+        result[name]=elapsed_time/tokens*1000000
+        print(f"Microseconds per token: {result[name]:.2f}\n")
+    print(f"Speedup: {result['feature dicts']/result['attributes']:.2f}x")
+    return result
+
+def bench_numpy_crf(lines:list[str], repeat:int=3)->dict[str,float]:
+    """ Tagging with crfsuite (attributes of AttributeEncoder) and with NumpyCRF (tags and marginals), warm caches, best of `repeat` runs.
+    Raises if the tags differ. Returns microseconds per token. """
+    pos_log=PosLogCRF()
+    pos_log.load_model()
+    tokenizer=PosLogTokenizer()
+    X=[tokenizer.tokenize(line) for line in lines]
+    tokens=sum([len(x) for x in X])
+    encoder=pos_log._get_attribute_encoder()
+    tagger=pos_log.crf.tagger_
+    numpy_crf=pos_log.export_numpy()
+    tag_crfsuite=lambda: [tagger.tag(attributes) for attributes in encoder.encode_batch(X)]
+    if tag_crfsuite()!=numpy_crf.predict_tokens(X):
+        raise AssertionError("tags of NumpyCRF differ from crfsuite")
+
+    result={}
+    for name, fn in [('crfsuite', tag_crfsuite), ('NumpyCRF', lambda: numpy_crf.predict_tokens(X)), ('NumpyCRF marginals', lambda: numpy_crf.predict_marginals_tokens(X))]:
+        elapsed_time=_best_time(fn, repeat)
+        _report(name, elapsed_time, len(X), tokens)
+        result[name]=elapsed_time/tokens*1000000
+        print(f"Microseconds per token: {result[name]:.2f}\n")
+    print(f"Speedup: {result['crfsuite']/result['NumpyCRF']:.2f}x")
+    return result
+
+def bench_parallel(lines:list[str], n_jobs_list:list[int]=None, repeat:int=3)->dict[int,float]:
+    """ Throughput of ParallelPosLogTagger (lines per second) for different numbers of workers. """
+    if n_jobs_list is None:
+        n_jobs_list=sorted({1, 2, 4, 8, 16, 32, os.cpu_count() or 1})
+    # repeat the lines, otherwise the pool start dominates
+    X=lines*repeat
+    result={}
+    for n_jobs in n_jobs_list:
+        with ParallelPosLogTagger(n_jobs=n_jobs) as tagger:
+            # warm up the workers
+            tagger.predict_strings(lines[:n_jobs*ParallelPosLogTagger.MIN_CHUNK_SIZE])
+            time_start=time.time()
+            tagger.predict_strings(X)
+            elapsed_time=time.time()-time_start
+        result[n_jobs]=len(X)/elapsed_time
+        print(f"n_jobs={n_jobs}: {result[n_jobs]:.0f} lines/s (speedup {result[n_jobs]/result[n_jobs_list[0]]:.2f}x)")
+    return result
+
+def bench_wordnet(lines:list[str], repeat:int=3)->float:
+    """ Compares wordnet.synsets() with the precomputed wordnet index of the Lexicon on the distinct tokens of the lines, verifies that both agree. Returns the speedup. """
+    from nltk.corpus import wordnet
+    from poslog.words import Lexicon
+    tokenizer=PosLogTokenizer()
+    tokens=list(dict.fromkeys(token for line in lines for token in tokenizer.tokenize(line)))
+    lexicon=Lexicon.from_nltk()
+    mismatches=lexicon.verify_wordnet(tokens)
+    if mismatches:
+        raise AssertionError(f"Wordnet index differs from wordnet.synsets() on {mismatches[:20]}")
+    forms=lexicon.wordnet
+
+    synsets_time=_best_time(lambda: [bool(wordnet.synsets(token)) for token in tokens], repeat)
+    index_time=_best_time(lambda: [token.lower() in forms for token in tokens], repeat)
+    print(f"wordnet.synsets: {synsets_time/len(tokens)*1000000:.2f} µs per token")
+    print(f"wordnet index: {index_time/len(tokens)*1000000:.2f} µs per token")
+    print(f"Speedup: {synsets_time/index_time:.0f}x ({len(tokens)} distinct tokens)\n")
+    return synsets_time/index_time
+
+def bench_token_class(lines:list[str], repeat:int=3)->dict[str,float]:
+    """ Differential test and timing of the RegexTokenClassMatcher modes (combined alternation, prefilter) against the sequential pattern loop
+    on the distinct tokens (PosLogTokenizer and whitespace split) of the lines. Returns microseconds per token of each mode. """
+    from poslog.words import RegexTokenClassMatcher
+    tokenizer=PosLogTokenizer()
+    tokens=list(dict.fromkeys(token for line in lines for token in tokenizer.tokenize(line)+line.split()))
+    matchers={
+        'sequential': RegexTokenClassMatcher(combined=False, prefilter=False),
+        'combined': RegexTokenClassMatcher(combined=True, prefilter=False),
+        'sequential+prefilter': RegexTokenClassMatcher(combined=False, prefilter=True),
+        'combined+prefilter': RegexTokenClassMatcher(combined=True, prefilter=True),
+    }
+    expected=matchers['sequential'].token_classes(tokens)
+    for name, matcher in matchers.items():
+        mismatches=[token for token, token_class, expected_class in zip(tokens, matcher.token_classes(tokens), expected) if token_class!=expected_class]
+        if mismatches:
+            raise AssertionError(f"Token classes ({name}) differ from sequential ones on {mismatches[:20]}")
+
+    result={}
+    for name, matcher in matchers.items():
+        elapsed_time=_best_time(lambda: matcher.token_classes(tokens), repeat)
+        result[name]=elapsed_time/len(tokens)*1000000
+        print(f"token_class ({name}): {result[name]:.2f} µs per token (speedup {result['sequential']/result[name]:.2f}x)")
+    matcher=RegexTokenClassMatcher(collect_stats=True)
+    matcher.token_classes(tokens)
+    print(f"Prefilter: {matcher.stats()}")
+    print(f"{len(tokens)} distinct tokens agree\n")
+    return result
+
+def bench_tokenizer(lines:list[str], repeat:int=3)->dict[str,float]:
+    """ Differential test and timing of the single pass PosLogTokenizer against the nltk path. Returns lines per second of each. """
+    tokenizers={
+        'nltk': PosLogTokenizer(single_pass=False),
+        'single_pass': PosLogTokenizer(single_pass=True),
+    }
+    expected=[tokenizers['nltk'].tokenize(line) for line in lines]
+    mismatches=[line for line, tokens, expected_tokens in zip(lines, (tokenizers['single_pass'].tokenize(line) for line in lines), expected) if tokens!=expected_tokens]
+    if mismatches:
+        raise AssertionError(f"Single pass tokens differ from nltk ones on {mismatches[:20]}")
+
+    result={}
+    for name, tokenizer in tokenizers.items():
+        elapsed_time=_best_time(lambda: [tokenizer.tokenize(line) for line in lines], repeat)
+        result[name]=len(lines)/elapsed_time
+        print(f"tokenize ({name}): {result[name]:.0f} lines/s (speedup {result[name]/result['nltk']:.2f}x)")
+    print(f"{len(lines)} lines agree\n")
+    return result
+
+def bench_incremental_training(examples:list[tuple[str,str]], new_dataset:str='Thunderbird', c2:float=1.0, max_iterations:int=50, seed:int=42)->dict[str,dict[str,float]]:
+    """ Compares PosLogCRF.train_incremental with a full retrain when labelled lines of a new log source arrive.
+    Labels are the bundled model's tags (silver labels). The base model is trained on 80% of the lines of the other datasets,
+    then updated with half of the lines of new_dataset, either incrementally or by retraining on base and new lines.
+    Reports training time and accuracy on the other half of new_dataset and on the held out 20% of the other datasets. """
+    import random
+    import tempfile
+    pos_log=PosLogCRF()
+    pos_log.load_model()
+    tokenizer=PosLogTokenizer()
+    X=[tokenizer.tokenize(line) for _, line in examples]
+    y=pos_log.predict_batch(X)
+    data=[(dataset, x, tags) for (dataset, _), x, tags in zip(examples, X, y) if x]
+    random.Random(seed).shuffle(data)
+    others=[(x, tags) for dataset, x, tags in data if dataset!=new_dataset]
+    new=[(x, tags) for dataset, x, tags in data if dataset==new_dataset]
+    base, test_others=others[:len(others)*4//5], others[len(others)*4//5:]
+    train_new, test_new=new[:len(new)//2], new[len(new)//2:]
+
+    def accuracy(model:PosLogCRF, sents:list[tuple[list[str],list[str]]])->float:
+        predicted=model.predict_batch([x for x, _ in sents])
+        return sum(p==t for (_, tags), pred in zip(sents, predicted) for p, t in zip(pred, tags))/sum(len(tags) for _, tags in sents)
+
+    def unzip(sents:list[tuple[list[str],list[str]]])->tuple[list[list[str]],list[list[str]]]:
+        return [x for x, _ in sents], [tags for _, tags in sents]
+
+    result={}
+    with tempfile.TemporaryDirectory() as tmp:
+        def run(name:str, train)->None:
+            model=PosLogCRF(model_path=os.path.join(tmp, f'{name}.crfsuite'))
+            time_start=time.time()
+            train(model)
+            elapsed_time=time.time()-time_start
+            result[name]={'time': elapsed_time, new_dataset: accuracy(model, test_new), 'others': accuracy(model, test_others)}
+            print(f"{name}: {elapsed_time:.2f} s, accuracy {new_dataset} {result[name][new_dataset]:.4f}, others {result[name]['others']:.4f}")
+
+        print(f"base {len(base)} lines, new {len(train_new)} {new_dataset} lines, test {len(test_new)} {new_dataset} and {len(test_others)} other lines")
+        run('base', lambda model: model.train(*unzip(base)))
+        base_path=os.path.join(tmp, 'base.crfsuite')
+        def incremental(model:PosLogCRF)->None:
+            shutil.copyfile(base_path, model.model_path)
+            model.load_model()
+            model.train_incremental(*unzip(train_new), c2=c2, max_iterations=max_iterations)
+        run('incremental', incremental)
+        run('full', lambda model: model.train(*unzip(base+train_new)))
+    print(f"Incremental update {result['full']['time']/result['incremental']['time']:.1f}x faster than full retraining\n")
+    return result
+
+def bench_training_features(lines:list[str], n_jobs:int=None, **pos_log_kwargs)->dict[str,float]:
+    """ Featurization of a training corpus: serial, on n_jobs processes and loaded from the feature disk cache (in a temporary directory),
+    each with a new PosLogCRF(**pos_log_kwargs) (cold static feature cache, like a new training run). Verifies that all agree. Returns seconds of each. """
+    import tempfile
+    tokenizer=PosLogTokenizer()
+    X=[tokenizer.tokenize(line) for line in lines]
+    result={}
+    with tempfile.TemporaryDirectory() as tmp:
+        expected=None
+        for name, jobs in [('serial', 1), ('parallel', n_jobs), ('disk cache', 1)]:
+            pos_log=PosLogCRF(feature_disk_cache=tmp if name=='disk cache' else False, **pos_log_kwargs)
+            # the cache entry of the feature set is written on the first (missing) run
+            if name=='disk cache':
+                pos_log.make_features_corpus(X)
+                pos_log=PosLogCRF(feature_disk_cache=tmp, **pos_log_kwargs)
+            time_start=time.time()
+            features=pos_log.make_features_corpus(X, jobs)
+            result[name]=time.time()-time_start
+            if expected is None:
+                expected=features
+            elif features!=expected:
+                raise AssertionError(f"Features ({name}) differ from serial ones")
+            print(f"make_features_corpus ({name}{', '+str(pos_log_kwargs) if pos_log_kwargs else ''}): {result[name]:.2f} s (speedup {result['serial']/result[name]:.2f}x)")
+    print(f"{len(X)} sentences agree\n")
+    return result
+
+def bench_pruning(examples:list[tuple[str,str]], manual:list[tuple[str,list[str],list[str]]], min_weights:list[float]=None, min_counts:list[int]=None, repeat:int=5)->dict[str,dict[str,float]]:
+    """ Prunes the bundled model by weight (PosLogCRF.prune_model) and by attribute frequency in the example lines.
+    Reports per model: features, file size (= model memory of crfsuite per process), load time, predict latency (per line),
+    agreement with the bundled model on the example lines and accuracy on the manually tagged lines. """
+    import tempfile
+    from poslog.CRFSuiteModel import CRFSuiteModel
+    min_weights=min_weights if min_weights is not None else [0.01, 0.05, 0.1, 0.2]
+    min_counts=min_counts if min_counts is not None else [2]
+    original=PosLogCRF()
+    original.load_model()
+    tokenizer=PosLogTokenizer()
+    X=[x for x in (tokenizer.tokenize(line) for _, line in examples) if x]
+    expected=original.predict_batch(X)
+    gold=[(tokens, tags) for _, tokens, tags in manual if tokens]
+
+    def measure(model_path:str)->dict[str,float]:
+        pos_log=PosLogCRF(model_path)
+        pos_log.load_model()
+        # the model only, not the known words of a new PosLogCRF
+        load=pos_log.load_model
+        y=pos_log.predict_batch(X)
+        latency=_best_time(lambda: [pos_log.predict(x) for x in X[:1000]], repeat)/len(X[:1000])
+        y_gold=pos_log.predict_batch([tokens for tokens, _ in gold])
+        tags=[(p, t) for (_, gold_tags), pred in zip(gold, y_gold) for p, t in zip(pred, gold_tags) if t is not None]
+        agreement=[(p, e) for pred, exp in zip(y, expected) for p, e in zip(pred, exp)]
+        return {
+            'features': len(CRFSuiteModel.from_crf(pos_log.crf)),
+            'bytes': os.path.getsize(pos_log.crf.modelfile.name),
+            'load ms': _best_time(load, repeat)*1000,
+            'predict µs/line': latency*1e6,
+            'agreement': sum(p==e for p, e in agreement)/len(agreement),
+            'accuracy': sum(p==t for p, t in tags)/len(tags),
+        }
+
+    result={'original': measure(original.model_path)}
+    with tempfile.TemporaryDirectory() as tmp:
+        for min_weight in min_weights:
+            result[f'min_weight={min_weight}']=measure(original.prune_model(os.path.join(tmp, f'w{min_weight}.crfsuite'), min_weight=min_weight))
+        for min_count in min_counts:
+            result[f'min_count={min_count}']=measure(original.prune_model(os.path.join(tmp, f'c{min_count}.crfsuite'), min_count=min_count, X_train_tokens=X))
+    for name, row in result.items():
+        print(f"{name}: "+', '.join(f"{key} {value}" if isinstance(value, int) else f"{key} {value:.4g}" for key, value in row.items())+f" ({row['bytes']/result['original']['bytes']:.1%} of the size)")
+    print()
+    return result
+
+def bench_cascade(examples:list[tuple[str,str]], taggers:dict=None, thresholds:list[float]=None)->dict[float,dict[str,float]]:
+    """ Confidence-gated cascade (util.pos.cascade) against running the ensemble (default: the five util.pos taggers) on every line.
+    The ensemble tags every line once (timed per line), the cascade time of a threshold is the PosLogCRF time plus the ensemble time of its escalated lines.
+    Reports per threshold the escalated lines and tokens, the speedup and the tokens whose cascade majority equals the ensemble majority. """
+    from util.pos import make_tag_comparison, NLTKPosTagger, StanzaPosTagger, SpacyPosTagger, HanTaPosTagger, TreeTaggerPosTagger
+    if thresholds is None:
+        thresholds=[0.5, 0.7, 0.8, 0.9, 0.95]
+    if taggers is None:
+        taggers={
+            'nltk': NLTKPosTagger().pos_tag,
+            'stanza': StanzaPosTagger().pos_tag,
+            'spacy': SpacyPosTagger().pos_tag,
+            'hanta': HanTaPosTagger().pos_tag,
+            'treetagger': TreeTaggerPosTagger().pos_tag,
+        }
+    tokenizer=PosLogTokenizer()
+    X=[tokenizer.tokenize(line) for _, line in examples]
+    tokens=sum([len(x) for x in X])
+
+    ensemble_majorities=[]
+    line_times=[]
+    for x in X:
+        time_start=time.time()
+        taggers_result={name: tagger_func(x) for name, tagger_func in taggers.items()}
+        line_times.append(time.time()-time_start)
+        ensemble_majorities.append(make_tag_comparison(taggers_result).majority)
+    ensemble_time=sum(line_times)
+    _report('ensemble (all lines)', ensemble_time, len(X), tokens)
+
+    pos_log=PosLogCRF()
+    pos_log.predict_batch_confidence(X[:10])
+    time_start=time.time()
+    crf_tags, crf_confidences=pos_log.predict_batch_confidence(X)
+    crf_time=time.time()-time_start
+    _report('PosLogCRF with confidences', crf_time, len(X), tokens)
+
+    result={}
+    for threshold in thresholds:
+        escalated=[min(confidences, default=1.0)<threshold for confidences in crf_confidences]
+        cascade_time=crf_time+sum(t for t, escalate in zip(line_times, escalated) if escalate)
+        majorities=[majority if escalate else tags for majority, tags, escalate in zip(ensemble_majorities, crf_tags, escalated)]
+        agreement=sum(a==b for m, e in zip(majorities, ensemble_majorities) for a, b in zip(m, e))/tokens
+        result[threshold]={
+            'escalated_lines': sum(escalated)/len(X),
+            'escalated_tokens': sum(len(x) for x, escalate in zip(X, escalated) if escalate)/tokens,
+            'speedup': ensemble_time/cascade_time,
+            'agreement': agreement,
+        }
+        print(f"threshold {threshold}: escalated {result[threshold]['escalated_lines']*100:.1f}% of the lines ({result[threshold]['escalated_tokens']*100:.1f}% of the tokens), "
+              f"speedup {result[threshold]['speedup']:.2f}x, majority agrees with the ensemble on {agreement*100:.1f}% of the tokens")
+    return result
@@ -0,0 +1,85 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+# statements measured with `python -X importtime`
+IMPORT_STATEMENTS=[
+    'import poslog',
+    'from poslog import PosLogTokenizer',
+    'from poslog import PosLogCRF',
+    'from poslog import PosLogClient',
+]
+
+# run in a fresh interpreter, prints the cumulative time of each startup stage in seconds
+FIRST_PREDICTION_SCRIPT="""
+import json, time
+time_start=time.perf_counter()
+times={}
+from poslog import PosLogCRF
+times['import']=time.perf_counter()-time_start
+pos_log=PosLogCRF()
+times['init']=time.perf_counter()-time_start
+pos_log.load_model()
+times['load_model']=time.perf_counter()-time_start
+pos_log.predict_string('Receiving block blk_123 src: /10.250.19.102:54106')
+times['first_prediction']=time.perf_counter()-time_start
+print(json.dumps(times))
+"""
+
+def _run_python(args:list[str])->subprocess.CompletedProcess:
+    # the child has to find poslog the same way this process does
+    env=dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+    return subprocess.run([sys.executable, *args], env=env, capture_output=True, text=True, check=True)
+
+def import_time(statement:str)->float:
+    """ Seconds spent on imports by `statement` according to `python -X importtime` (without the interpreter's own imports). """
+    def total(stmt:str)->dict[str,int]:
+        result={}
+        for line in _run_python(['-X', 'importtime', '-c', stmt]).stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumulative, name=line[len('import time:'):].split('|')
+            # top level imports only, nested ones are included in the cumulative time
+            if not name.startswith('  '):
+                result[name.strip()]=int(cumulative)
+        return result
+    baseline=total('pass')
+    imports=total(stmt=statement)
+    return sum(us for name, us in imports.items() if name not in baseline)/1000000
+
+def bench_startup(repeat:int=3, verbose:bool=True)->dict[str,float]:
+    """ Import time of the public entry points and the time to the first prediction in a fresh process (best of `repeat` runs, seconds). """
+    result={}
+    for statement in IMPORT_STATEMENTS:
+        result[statement]=min(import_time(statement) for _ in range(repeat))
+        if verbose:
+            print(f"{statement}: {result[statement]*1000:.1f} ms")
+    runs=[json.loads(_run_python(['-c', FIRST_PREDICTION_SCRIPT]).stdout) for _ in range(repeat)]
+    for stage in runs[0]:
+        result[stage]=min(run[stage] for run in runs)
+        if verbose:
+            print(f"{stage}: {result[stage]*1000:.1f} ms (cumulative)")
+    if verbose:
+        print()
+    return result
+
+def bench_lexicon(repeat:int=3)->dict[str,float]:
+    """ Time to get the word lists of KnownWordsDetector from the nltk corpora vs. from a prebuilt lexicon file (best of `repeat` runs, seconds). """
+    from poslog.words import Lexicon
+    import tempfile
+    result={}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path=os.path.join(tmp_dir, 'known_words.lexicon')
+        Lexicon.from_nltk().save(path)
+        for name, load in [('nltk', Lexicon.from_nltk), ('lexicon', lambda: Lexicon.load(path))]:
+            result[name]=min(_time(load) for _ in range(repeat))
+            print(f"{name}: {result[name]*1000:.1f} ms")
+    print(f"Speedup: {result['nltk']/result['lexicon']:.2f}x\n")
+    return result
+
+def _time(fn)->float:
+    time_start=time.perf_counter()
+    fn()
+    return time.perf_counter()-time_start
@@ -0,0 +1,27 @@
+import ast
+import csv
+import glob
+import os
+
+OUT_DIR=os.path.join(os.path.dirname(__file__), '..', '..', 'out', 'poslog')
+EXAMPLES_FILE=os.path.join(OUT_DIR, '1_examples_10000_each_seed-42_numb_var.csv')
+MANUAL_TAGGING_FILE=os.path.join(OUT_DIR, '3_random_sample_wip_upos.csv')
+
+def load_examples(file:str=EXAMPLES_FILE)->list[tuple[str,str]]:
+    """ Returns (dataset, log line) pairs of the example csv. """
+    with open(file, 'r', encoding='utf-8', newline='') as f:
+        return [(row['Dataset'], row['Example']) for row in csv.DictReader(f)]
+
+def load_manual_tagging(file:str=MANUAL_TAGGING_FILE)->list[tuple[str,list[str],list[str]]]:
+    """ Returns (dataset, tokens, tags) of the manually tagged sample (tags may be None). """
+    with open(file, 'r', encoding='utf-8', newline='') as f:
+        return [(row['Dataset'], ast.literal_eval(row['Tokens']), ast.literal_eval(row['ManualTagging'])) for row in csv.DictReader(f)]
+
+def load_corpus_lines(out_dir:str=OUT_DIR)->list[str]:
+    """ Returns the examples and templates of all csv files in out/poslog. """
+    lines=[]
+    for file in sorted(glob.glob(os.path.join(out_dir, '*.csv'))):
+        with open(file, 'r', encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f):
+                lines+=[row[column] for column in ('Example', 'Template') if row.get(column)]
+    return lines
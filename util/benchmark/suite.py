@@ -0,0 +1,223 @@
+from poslog import PosLogCRF, PosLogTokenizer
+from util.benchmark.examples import load_examples
+from util.benchmark.bench_startup import bench_startup
+from collections.abc import Callable
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+# stages of PosLog measured separately, in the order of the pipeline (without feature cache),
+# predict_warm is predict with the default feature cache (steady state of repetitive logs)
+STAGES=('tokenize', 'kind_of_known_word', 'token_class', 'make_features', 'predict', 'predict_string', 'predict_warm')
+# results of all lines of a stage, besides one per log source (dataset)
+ALL='all'
+# seconds of bench_startup in a fresh process (imports, first prediction), lower is better unlike the throughputs of the stages
+STARTUP='startup'
+LOWER_IS_BETTER=(STARTUP,)
+DEFAULT_BASELINE=os.path.join(os.path.dirname(__file__), '..', '..', 'out', 'benchmark', 'baseline.json')
+# percent of the baseline throughput a stage may lose
+DEFAULT_MAX_REGRESSION=10.0
+# runs per measurement and their minimum duration in seconds, the median run counts
+DEFAULT_REPEAT=5
+DEFAULT_MIN_TIME=0.2
+# measurements of regressed cells before failing, the best counts (a regression has to persist)
+DEFAULT_CONFIRM=2
+# fresh processes per startup time, the fastest counts
+DEFAULT_STARTUP_REPEAT=3
+
+######################
+# Measurement
+######################
+
+def _throughput(fn:Callable[[],object], tokens:int, repeat:int, min_time:float)->float:
+    """ Tokens per second of fn (median of `repeat` runs, robust against single slow or fast runs), each run calls fn until at least min_time passed. """
+    fn()
+    times=[]
+    for _ in range(repeat):
+        calls=0
+        time_start=time.perf_counter()
+        while True:
+            fn()
+            calls+=1
+            elapsed_time=time.perf_counter()-time_start
+            if elapsed_time>=min_time:
+                break
+        times.append(elapsed_time/calls)
+    return tokens/statistics.median(times)
+
+def _stage_functions(pos_log:PosLogCRF, pos_log_warm:PosLogCRF, tokenizer:PosLogTokenizer, lines:list[str], X:list[list[str]])->dict[str,Callable[[],object]]:
+    kwdet=pos_log.kwdet
+    rgtcm=pos_log.rgtcm
+    words=[token for x in X for token in x]
+    return {
+        'tokenize': lambda: [tokenizer.tokenize(line) for line in lines],
+        'kind_of_known_word': lambda: [kwdet.kind_of_known_word(word) for word in words],
+        'token_class': lambda: [rgtcm.token_class(word) for word in words],
+        'make_features': lambda: [pos_log.make_features(x) for x in X],
+        'predict': lambda: [pos_log.predict(x) for x in X],
+        'predict_string': lambda: [pos_log.predict_string(line) for line in lines],
+        'predict_warm': lambda: [pos_log_warm.predict(x) for x in X],
+    }
+
+def run_suite(examples:list[tuple[str,str]], stages:list[str]=None, datasets:list[str]=None, repeat:int=DEFAULT_REPEAT, min_time:float=DEFAULT_MIN_TIME)->dict[str,dict[str,float]]:
+    """ Throughput (tokens per second) of each stage per log source of the (dataset, line) examples and for all lines (unless datasets are selected).
+    Stages run without feature cache (and without the opt-in result cache), so the known words and regex lookups inside the featurization are measured;
+    predict_warm uses the default feature cache. Calls are line by line, as in notebook 5. Returns {stage: {dataset: tokens per second}}. """
+    stages=list(stages) if stages is not None else list(STAGES)
+    unknown=set(stages)-set(STAGES)
+    if unknown:
+        raise ValueError(f"Unknown stages: {sorted(unknown)}")
+    # with the feature cache, make_features and predict would measure cache hits
+    pos_log=PosLogCRF(feature_cache_size=0)
+    pos_log.load_model()
+    pos_log_warm=PosLogCRF()
+    pos_log_warm.load_model()
+    tokenizer=PosLogTokenizer()
+
+    groups:dict[str,list[str]]={}
+    for dataset, line in examples:
+        groups.setdefault(dataset, []).append(line)
+    all_lines=[line for lines in groups.values() for line in lines]
+    if datasets is not None:
+        groups={dataset: groups[dataset] for dataset in datasets if dataset in groups}
+    # all lines only if selected or without selection, i.e. all of them
+    if datasets is None or ALL in datasets:
+        groups[ALL]=all_lines
+
+    results:dict[str,dict[str,float]]={stage: {} for stage in stages}
+    for dataset, lines in groups.items():
+        X=[tokenizer.tokenize(line) for line in lines]
+        tokens=sum([len(x) for x in X])
+        functions=_stage_functions(pos_log, pos_log_warm, tokenizer, lines, X)
+        for stage in stages:
+            results[stage][dataset]=_throughput(functions[stage], tokens, repeat, min_time)
+    return results
+
+def run_startup(metrics:list[str]=None, repeat:int=DEFAULT_STARTUP_REPEAT)->dict[str,dict[str,float]]:
+    """ Startup times of bench_startup (import time of the entry points, cumulative time to the first prediction) in seconds.
+    Returns {STARTUP: {metric: seconds}}, of the given metrics only if selected. """
+    times=bench_startup(repeat, verbose=False)
+    return {STARTUP: {metric: seconds for metric, seconds in times.items() if metrics is None or metric in metrics}}
+
+def _is_better(stage:str, current:float, other:float)->bool:
+    return current<other if stage in LOWER_IS_BETTER else current>other
+
+######################
+# Baseline
+######################
+
+def save_baseline(results:dict[str,dict[str,float]], path:str=DEFAULT_BASELINE)->None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    baseline={
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.platform(),
+        'results': results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=2)
+
+def load_baseline(path:str=DEFAULT_BASELINE)->dict[str,dict[str,float]]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)['results']
+
+def compare_to_baseline(results:dict[str,dict[str,float]], baseline:dict[str,dict[str,float]], max_regression:float=DEFAULT_MAX_REGRESSION)->list[tuple[str,str,float,float,float]]:
+    """ (stage, dataset, baseline, current, change in percent) of the measurements that lost more than max_regression percent of the baseline throughput,
+    or took more than max_regression percent longer than the baseline for the startup times. Measurements without baseline are skipped. """
+    regressions=[]
+    for stage, datasets in results.items():
+        for dataset, current in datasets.items():
+            base=baseline.get(stage, {}).get(dataset)
+            if base is None:
+                continue
+            change=(current-base)/base*100
+            if (change>max_regression) if stage in LOWER_IS_BETTER else (change< -max_regression):
+                regressions.append((stage, dataset, base, current, change))
+    return regressions
+
+def report(results:dict[str,dict[str,float]], baseline:dict[str,dict[str,float]]=None)->str:
+    """ Tokens per second per dataset (rows) and stage (columns), with the change to the baseline in percent; the startup times in milliseconds below. """
+    out=_table(results, baseline, [stage for stage in results if stage not in LOWER_IS_BETTER], 'dataset', 1)
+    for stage in LOWER_IS_BETTER:
+        if stage in results:
+            out+='\n\n'+_table({'ms': results[stage]}, {'ms': (baseline or {}).get(stage, {})}, ['ms'], stage, 1000)
+    return out
+
+def _table(results:dict[str,dict[str,float]], baseline:dict[str,dict[str,float]], stages:list[str], title:str, scale:float)->str:
+    datasets=list(dict.fromkeys(dataset for stage in stages for dataset in results[stage]))
+    def cell(stage:str, dataset:str)->str:
+        current=results[stage].get(dataset)
+        if current is None:
+            return ''
+        base=(baseline or {}).get(stage, {}).get(dataset)
+        value=f"{current*scale:,.0f}" if scale==1 else f"{current*scale:,.1f}"
+        return value if base is None else f"{value} ({(current-base)/base*100:+.1f}%)"
+    header=[title]+stages
+    rows=[[dataset]+[cell(stage, dataset) for stage in stages] for dataset in datasets]
+    widths=[max(len(row[i]) for row in [header]+rows) for i in range(len(header))]
+    return '\n'.join('  '.join(c.rjust(w) if i>0 else c.ljust(w) for i, (c, w) in enumerate(zip(row, widths))) for row in [header]+rows)
+
+######################
+# Command Line
+######################
+
+def main(argv:list[str]=None)->int:
+    parser=argparse.ArgumentParser(prog='python -m util.benchmark.suite', description="Throughput of PosLog's stages per log source of the example lines (tokens per second) and its startup times.")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="baseline file (default: out/benchmark/baseline.json)")
+    parser.add_argument('--save-baseline', action='store_true', help="store the results as the new baseline instead of comparing")
+    parser.add_argument('--max-regression', type=float, default=DEFAULT_MAX_REGRESSION, help=f"percent of the baseline throughput a stage may lose, or a startup time may gain (default: {DEFAULT_MAX_REGRESSION})")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, help="stages to measure (default: all)")
+    parser.add_argument('--datasets', nargs='+', help=f"log sources to measure, '{ALL}' for all lines (default: each and '{ALL}')")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help=f"runs per measurement, the median counts (default: {DEFAULT_REPEAT})")
+    parser.add_argument('--min-time', type=float, default=DEFAULT_MIN_TIME, help=f"seconds per run (default: {DEFAULT_MIN_TIME})")
+    parser.add_argument('--confirm', type=int, default=DEFAULT_CONFIRM, help=f"measure regressed stages again up to this many times before failing (default: {DEFAULT_CONFIRM})")
+    parser.add_argument('--skip-startup', action='store_true', help="do not measure the startup times (imports and first prediction in fresh processes)")
+    parser.add_argument('--startup-repeat', type=int, default=DEFAULT_STARTUP_REPEAT, help=f"fresh processes per startup time, the fastest counts (default: {DEFAULT_STARTUP_REPEAT})")
+    args=parser.parse_args(argv)
+
+    examples=load_examples()
+    results=run_suite(examples, args.stages, args.datasets, args.repeat, args.min_time)
+    if not args.skip_startup:
+        results.update(run_startup(repeat=args.startup_repeat))
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+        print(report(results))
+        print(f"Saved baseline to '{args.baseline}'")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(report(results))
+        print(f"No baseline '{args.baseline}', create one with --save-baseline")
+        return 0
+    baseline=load_baseline(args.baseline)
+    regressions=compare_to_baseline(results, baseline, args.max_regression)
+    for _ in range(args.confirm):
+        if not regressions:
+            break
+        # noise of a single measurement (e.g. another process) does not persist, keep the best of the measurements
+        throughputs=[r for r in regressions if r[0] not in LOWER_IS_BETTER]
+        again={}
+        if throughputs:
+            again.update(run_suite(examples, list(dict.fromkeys(r[0] for r in throughputs)), list(dict.fromkeys(r[1] for r in throughputs)), args.repeat, args.min_time))
+        if any(r[0]==STARTUP for r in regressions):
+            again.update(run_startup([r[1] for r in regressions if r[0]==STARTUP], args.startup_repeat))
+        for stage, dataset, _, _, _ in regressions:
+            if _is_better(stage, again[stage][dataset], results[stage][dataset]):
+                results[stage][dataset]=again[stage][dataset]
+        regressions=compare_to_baseline(results, baseline, args.max_regression)
+    print(report(results, baseline))
+    for stage, dataset, base, current, change in regressions:
+        if stage in LOWER_IS_BETTER:
+            print(f"Regression: {stage} {dataset} {current*1000:,.1f} ms instead of {base*1000:,.1f} ({change:+.1f}%)", file=sys.stderr)
+        else:
+            print(f"Regression: {stage} on {dataset} {current:,.0f} tokens/s instead of {base:,.0f} ({change:+.1f}%)", file=sys.stderr)
+    if regressions:
+        print(f"{len(regressions)} measurements regressed by more than {args.max_regression}%", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,4 @@
 from .tag_comparison import *
+from .cascade import *
 from .PosTagger import *
 from .tagset_mapping import *
\ No newline at end of file
@@ -0,0 +1,71 @@
+######################
+# Cascade
+######################
+from collections.abc import Callable
+from dataclasses import dataclass
+import time
+
+from poslog import PosLogCRF
+from .tag_comparison import TagComparison, make_tag_comparison
+
+@dataclass
+class CascadeResult:
+    tag_comparisons:  list[TagComparison]
+    # per line: True if tagged by the ensemble, False if by PosLogCRF
+    escalated:        list[bool]
+    crf_time:         float
+    ensemble_time:    float
+    tokens:           int
+    escalated_tokens: int
+
+    @property
+    def escalation_rate(self)->float:
+        return sum(self.escalated)/len(self.escalated) if self.escalated else 0.0
+
+    def estimated_speedup(self)->float:
+        """ Time of the ensemble on all lines (extrapolated per token from the escalated lines) divided by the time of the cascade. """
+        if self.escalated_tokens==0:
+            return float('inf')
+        full_ensemble_time=self.ensemble_time/self.escalated_tokens*self.tokens
+        return full_ensemble_time/(self.crf_time+self.ensemble_time)
+
+def cascade_tag_comparisons(X:list[list[str]], taggers:dict[str,Callable[[list[str]],list[str]]], pos_log:PosLogCRF=None, threshold:float=0.8, tagset='upos')->CascadeResult:
+    """ Tags the token lists with PosLogCRF first. Lines whose least confident token (marginal probability of its CRF tag) is below threshold
+    are tagged by all taggers (e.g. {'nltk': nltk_tagger.pos_tag, ...}) and compared by make_tag_comparison.
+    The other lines keep the CRF tags: majority are the tags, confidence their marginals and there is no minority. """
+    if not taggers:
+        raise ValueError("No taggers provided.")
+    if pos_log is None:
+        pos_log=PosLogCRF()
+
+    time_start=time.time()
+    crf_tags, crf_confidences=pos_log.predict_batch_confidence(X)
+    crf_time=time.time()-time_start
+
+    escalated=[min(confidences, default=1.0)<threshold for confidences in crf_confidences]
+    tag_comparisons:list[TagComparison]=[]
+    ensemble_time=0.0
+    for tokens, tags, confidences, escalate in zip(X, crf_tags, crf_confidences, escalated):
+        if escalate:
+            time_start=time.time()
+            taggers_result={name: tagger_func(tokens) for name, tagger_func in taggers.items()}
+            ensemble_time+=time.time()-time_start
+            tag_comparisons.append(make_tag_comparison(taggers_result, tagset))
+        else:
+            tag_comparisons.append(TagComparison(tags, confidences, [{} for _ in tags]))
+
+    return CascadeResult(
+        tag_comparisons=tag_comparisons,
+        escalated=escalated,
+        crf_time=crf_time,
+        ensemble_time=ensemble_time,
+        tokens=sum(len(tokens) for tokens in X),
+        escalated_tokens=sum(len(tokens) for tokens, escalate in zip(X, escalated) if escalate),
+    )
+
+def print_stats_on_cascade(result:CascadeResult)->None:
+    lines=len(result.escalated)
+    print(f"Escalated to the ensemble: {sum(result.escalated)} of {lines} lines ({result.escalation_rate*100:.2f}%), {result.escalated_tokens} of {result.tokens} tokens")
+    print(f"Time PosLogCRF: {result.crf_time:.2f} seconds")
+    print(f"Time ensemble: {result.ensemble_time:.2f} seconds")
+    print(f"Estimated speedup over the ensemble on all lines: {result.estimated_speedup():.2f}x")